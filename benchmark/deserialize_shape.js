@@ -0,0 +1,105 @@
+/*
+ *    Copyright 2016 Rethink Robotics
+ *
+ *    Copyright 2016 Chris Smith
+ *
+ *    Licensed under the Apache License, Version 2.0 (the "License");
+ *    you may not use this file except in compliance with the License.
+ *    You may obtain a copy of the License at
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *    Unless required by applicable law or agreed to in writing, software
+ *    distributed under the License is distributed on an "AS IS" BASIS,
+ *    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *    See the License for the specific language governing permissions and
+ *    limitations under the License.
+ */
+
+'use strict';
+
+//-----------------------------------------------------------------------------
+// Measures a consumer loop over a mix of constructed and deserialized
+// messages. Deserialized messages are instances of the message class, so
+// the loop only ever sees one object shape per type. The "legacy" case
+// rebuilds them the way deserialize used to - starting from {} and adding
+// fields one by one - which gives them a second shape.
+//
+//   node benchmark/deserialize_shape.js [prefix] [count]
+//
+// The messages are the generated geometry_msgs/PoseStamped from a prefix
+// written by test/generate_fixtures.py. Without one, the fixtures are
+// generated into a temporary directory with $PYTHON, which needs genmsg.
+//-----------------------------------------------------------------------------
+
+let path = require('path');
+
+let prefix = process.argv[2];
+let finder;
+if (prefix === undefined || /^\d+$/.test(prefix)) {
+  finder = require('../test/common.js').generate().finder;
+}
+else {
+  process.env.CMAKE_PREFIX_PATH = path.resolve(prefix);
+  finder = require(path.join(path.resolve(prefix), 'share/node_js/find.js'));
+}
+let PoseStamped = finder('geometry_msgs').msg.PoseStamped;
+
+let legacyShape = function(msg) {
+  if (typeof msg !== 'object' || msg === null || Array.isArray(msg) || Buffer.isBuffer(msg)) {
+    return msg;
+  }
+  // else
+  let data = {};
+  Object.keys(msg).forEach((key) => {
+    data[key] = legacyShape(msg[key]);
+  });
+  return data;
+}
+
+let consume = function(msgs) {
+  let sum = 0;
+  for (let i = 0; i < msgs.length; ++i) {
+    let msg = msgs[i];
+    sum += msg.header.seq + msg.pose.position.x + msg.pose.position.y +
+           msg.pose.orientation.z + msg.pose.orientation.w;
+  }
+  return sum;
+}
+
+let time = function(name, msgs, rounds) {
+  // warm up, then take the best of several runs
+  consume(msgs);
+  let best = Infinity;
+  for (let r = 0; r < rounds; ++r) {
+    let start = process.hrtime();
+    consume(msgs);
+    let elapsed = process.hrtime(start);
+    best = Math.min(best, elapsed[0] * 1e9 + elapsed[1]);
+  }
+  console.log(name + ': ' + (best / msgs.length).toFixed(2) + ' ns/message');
+}
+
+let count = parseInt(process.argv[process.argv.length - 1], 10) || 200000;
+let decoded = [];
+let legacy = [];
+let constructed = [];
+for (let i = 0; i < count; ++i) {
+  let msg = new PoseStamped();
+  msg.header.seq = i;
+  msg.pose.position.x = i * 0.5;
+  msg.pose.orientation.w = 1.0;
+  let bufferInfo = PoseStamped.serialize(msg, {buffer: [], length: 0});
+  let data = PoseStamped.deserialize(Buffer.concat(bufferInfo.buffer, bufferInfo.length)).data;
+  constructed.push(msg);
+  decoded.push(data);
+  legacy.push(legacyShape(data));
+}
+
+// interleave constructed messages with decoded ones, as a consumer handling
+// both locally created and received messages would see them
+let mix = function(received) {
+  return received.map((msg, i) => i % 2 ? msg : constructed[i]);
+}
+
+time('class instances (constructed + deserialized)', mix(decoded), 20);
+time('legacy object literals (constructed + deserialized)', mix(legacy), 20);
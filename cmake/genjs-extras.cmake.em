@@ -1,11 +1,17 @@
 @[if DEVELSPACE]@
 # bin variable in develspace
 set(GENJS_BIN "@(CMAKE_CURRENT_SOURCE_DIR)/scripts/gen_js.py")
+set(GENJS_CODE_CACHE_BIN "@(CMAKE_CURRENT_SOURCE_DIR)/src/genjs/code_cache.js")
 @[else]@
 # bin variable in installspace
 set(GENJS_BIN "${genjs_DIR}/../../../@(CATKIN_PACKAGE_BIN_DESTINATION)/gen_js.py")
+set(GENJS_CODE_CACHE_BIN "${genjs_DIR}/../../node_js/code_cache.js")
 @[end if]@
 
+# GENJS_FLAGS can hold extra generator flags, e.g. set(GENJS_FLAGS --json)
+# to also emit a toJSONString transcoder for each message, or --columnar to
+# decode arrays of small fixed-size messages into TypedArray columns
+
 # Generate .msg or .srv -> .js
 # The generated .js files should be added ALL_GEN_OUTPUT_FILES_js
 macro(_generate_js ARG_PKG ARG_MSG ARG_IFLAGS ARG_MSG_DEPS ARG_GEN_OUTPUT_DIR)
@@ -25,6 +31,7 @@ macro(_generate_js ARG_PKG ARG_MSG ARG_IFLAGS ARG_MSG_DEPS ARG_GEN_OUTPUT_DIR)
     ${ARG_IFLAGS}
     -p ${ARG_PKG}
     -o ${ARG_GEN_OUTPUT_DIR}
+    ${GENJS_FLAGS}
     COMMENT "Generating Javascript code from ${ARG_PKG}/${MSG_NAME}"
     )
 
@@ -42,7 +49,32 @@ macro(_generate_srv_js ARG_PKG ARG_SRV ARG_IFLAGS ARG_MSG_DEPS ARG_GEN_OUTPUT_DI
   _generate_js(${ARG_PKG} ${ARG_SRV} "${ARG_IFLAGS}" "${ARG_MSG_DEPS}" "${ARG_GEN_OUTPUT_DIR}/srv")
 endmacro()
 
+# Set GENJS_CODE_CACHE to pre-compile the generated modules of each package
+# into a V8 code cache, which code_cache.js install() loads from
 macro(_generate_module_js ARG_PKG ARG_GEN_OUTPUT_DIR ARG_GENERATED_FILES)
+  if(GENJS_CODE_CACHE)
+    find_program(GENJS_NODE_EXECUTABLE NAMES node nodejs)
+    if(GENJS_NODE_EXECUTABLE)
+      # declare every manifest and .js.cache file so a clean removes them,
+      # including those of the _index.js modules in each directory
+      set(GEN_OUTPUT_FILE ${ARG_GEN_OUTPUT_DIR}/_code_cache.json)
+      set(GEN_CACHE_FILES ${ARG_GEN_OUTPUT_DIR}/_index.js.cache)
+      foreach(GEN_FILE ${ARG_GENERATED_FILES})
+        get_filename_component(GEN_DIR ${GEN_FILE} DIRECTORY)
+        list(APPEND GEN_CACHE_FILES ${GEN_FILE}.cache ${GEN_DIR}/_index.js.cache ${GEN_DIR}/_code_cache.json)
+      endforeach()
+      list(REMOVE_DUPLICATES GEN_CACHE_FILES)
+      list(REMOVE_ITEM GEN_CACHE_FILES ${GEN_OUTPUT_FILE})
+      add_custom_command(OUTPUT ${GEN_OUTPUT_FILE} ${GEN_CACHE_FILES}
+        DEPENDS ${GENJS_CODE_CACHE_BIN} ${ARG_GENERATED_FILES}
+        COMMAND ${CATKIN_ENV} ${GENJS_NODE_EXECUTABLE} ${GENJS_CODE_CACHE_BIN} ${ARG_GEN_OUTPUT_DIR}
+        COMMENT "Generating V8 code cache for ${ARG_PKG}"
+        )
+      list(APPEND ALL_GEN_OUTPUT_FILES_js ${GEN_OUTPUT_FILE} ${GEN_CACHE_FILES})
+    else()
+      message(WARNING "GENJS_CODE_CACHE is set but node was not found, not generating a code cache for ${ARG_PKG}")
+    endif()
+  endif()
 endmacro()
 
 set(node_js_INSTALL_DIR share/node_js)
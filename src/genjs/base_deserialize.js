@@ -142,6 +142,54 @@ let BoolDeserializer = function(buffer) {
   return ret;
 };
 
+//-----------------------------------------------------------------------------
+// Field Masks
+//-----------------------------------------------------------------------------
+
+// compiled masks keyed by their joined paths, so a path list that is
+// modified after its first use doesn't get a stale mask
+let compiledMasks = new Map();
+const MAX_COMPILED_MASKS = 256;
+
+// Converts a list of field paths like ['header', 'pose.position'] into the
+// nested mask object generated deserializeFields() methods expect, e.g.
+// {header: true, pose: {position: true}}. Mask objects are passed through
+// and compiled path lists are cached, so a list can be reused cheaply.
+// Paths into builtin fields such as 'header.stamp.secs' select the whole
+// builtin field.
+let FieldMask = function(fields) {
+  if (!Array.isArray(fields)) {
+    return fields;
+  }
+  let key = fields.join('\n');
+  let mask = compiledMasks.get(key);
+  if (mask !== undefined) {
+    return mask;
+  }
+  // else
+  mask = {};
+  fields.forEach((path) => {
+    let names = path.split('.');
+    let node = mask;
+    for (let i = 0; i < names.length - 1; ++i) {
+      if (node[names[i]] === true) {
+        // a parent path was already selected in full
+        return;
+      }
+      if (!node[names[i]]) {
+        node[names[i]] = {};
+      }
+      node = node[names[i]];
+    }
+    node[names[names.length - 1]] = true;
+  });
+  if (compiledMasks.size >= MAX_COMPILED_MASKS) {
+    compiledMasks.clear();
+  }
+  compiledMasks.set(key, mask);
+  return mask;
+};
+
 //-----------------------------------------------------------------------------
 
 module.exports = {
@@ -160,5 +208,6 @@ module.exports = {
   char: UInt8Deserializer,
   byte: Int8Deserializer,
   time: TimeDeserializer,
-  duration: TimeDeserializer
+  duration: TimeDeserializer,
+  fieldMask: FieldMask
 };
@@ -0,0 +1,140 @@
+/*
+ *    Copyright 2016 Rethink Robotics
+ *
+ *    Copyright 2016 Chris Smith
+ *
+ *    Licensed under the Apache License, Version 2.0 (the "License");
+ *    you may not use this file except in compliance with the License.
+ *    You may obtain a copy of the License at
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *    Unless required by applicable law or agreed to in writing, software
+ *    distributed under the License is distributed on an "AS IS" BASIS,
+ *    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *    See the License for the specific language governing permissions and
+ *    limitations under the License.
+ */
+
+'use strict'
+
+//-----------------------------------------------------------------------------
+// Base Type JSON Transcoder Functions
+//
+// Each function reads a single serialized value at offset and returns its
+// JSON text, matching what JSON.stringify() produces for the value returned
+// by the corresponding deserializer. Advancing the offset is left to the
+// generated code, which knows the size of every fixed-width type.
+//-----------------------------------------------------------------------------
+
+let numberText = function(val) {
+  // JSON has no representation for NaN or +/-Infinity
+  return isFinite(val) ? String(val) : 'null';
+}
+
+let bufferText = function(buffer, start, end) {
+  // Mirrors Buffer.prototype.toJSON()
+  let json = '{"type":"Buffer","data":[';
+  for (let i = start; i < end; ++i) {
+    if (i > start) {
+      json += ',';
+    }
+    json += buffer[i];
+  }
+  return json + ']}';
+}
+
+let StringJSON = function(buffer, offset) {
+  let len = buffer.readUInt32LE(offset);
+  return JSON.stringify(buffer.toString('utf8', offset + 4, offset + 4 + len));
+}
+
+let UInt8JSON = function(buffer, offset) {
+  return String(buffer.readUInt8(offset));
+}
+
+let UInt16JSON = function(buffer, offset) {
+  return String(buffer.readUInt16LE(offset));
+}
+
+let UInt32JSON = function(buffer, offset) {
+  return String(buffer.readUInt32LE(offset));
+}
+
+let Int8JSON = function(buffer, offset) {
+  return String(buffer.readInt8(offset));
+}
+
+let Int16JSON = function(buffer, offset) {
+  return String(buffer.readInt16LE(offset));
+}
+
+let Int32JSON = function(buffer, offset) {
+  return String(buffer.readInt32LE(offset));
+}
+
+let Int64JSON = function(buffer, offset) {
+  // 64 bit integers deserialize to raw 8 byte buffers
+  return bufferText(buffer, offset, offset + 8);
+}
+
+let Float32JSON = function(buffer, offset) {
+  return numberText(buffer.readFloatLE(offset));
+}
+
+let Float64JSON = function(buffer, offset) {
+  return numberText(buffer.readDoubleLE(offset));
+}
+
+let TimeJSON = function(buffer, offset) {
+  return '{"secs":' + buffer.readInt32LE(offset) +
+         ',"nsecs":' + buffer.readInt32LE(offset + 4) + '}';
+}
+
+let BoolJSON = function(buffer, offset) {
+  return buffer.readInt8(offset) ? 'true' : 'false';
+}
+
+let UInt8ArrayJSON = function(buffer, offset, len, options) {
+  // uint8[] deserializes to a Buffer - optionally emit it as base64 text
+  // instead of the much larger Buffer.toJSON() form
+  if (options && options.base64) {
+    return '"' + buffer.toString('base64', offset, offset + len) + '"';
+  }
+  return bufferText(buffer, offset, offset + len);
+}
+
+let MessageJSON = function(Msg, buffer, bufferOffset, options) {
+  if (typeof Msg.toJSONString === 'function') {
+    return Msg.toJSONString(buffer, bufferOffset, options);
+  }
+  // else
+  // the message's package was generated without --json - decode it instead.
+  // options.base64 doesn't apply here since uint8[] and int64 fields both
+  // deserialize to Buffers
+  let tmp = Msg.deserialize(buffer.slice(bufferOffset[0]));
+  bufferOffset[0] = buffer.length - tmp.buffer.length;
+  return JSON.stringify(tmp.data);
+}
+
+//-----------------------------------------------------------------------------
+
+module.exports = {
+  string: StringJSON,
+  float32: Float32JSON,
+  float64: Float64JSON,
+  bool: BoolJSON,
+  int8: Int8JSON,
+  int16: Int16JSON,
+  int32: Int32JSON,
+  int64: Int64JSON,
+  uint8: UInt8JSON,
+  uint16: UInt16JSON,
+  uint32: UInt32JSON,
+  uint64: Int64JSON,
+  char: UInt8JSON,
+  byte: Int8JSON,
+  time: TimeJSON,
+  duration: TimeJSON,
+  uint8Array: UInt8ArrayJSON,
+  message: MessageJSON
+};
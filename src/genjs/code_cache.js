@@ -0,0 +1,257 @@
+/*
+ *    Copyright 2016 Rethink Robotics
+ *
+ *    Copyright 2016 Chris Smith
+ *
+ *    Licensed under the Apache License, Version 2.0 (the "License");
+ *    you may not use this file except in compliance with the License.
+ *    You may obtain a copy of the License at
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *    Unless required by applicable law or agreed to in writing, software
+ *    distributed under the License is distributed on an "AS IS" BASIS,
+ *    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *    See the License for the specific language governing permissions and
+ *    limitations under the License.
+ */
+
+'use strict';
+
+//-----------------------------------------------------------------------------
+// V8 code cache for generated message packages
+//
+// build() pre-compiles every generated module under a directory and stores
+// the V8 code cache next to it as Foo.js.cache, with a _code_cache.json
+// manifest per directory recording the node version and a hash of each
+// source file. install() hooks require() so that modules with a matching
+// manifest entry are compiled from the cache, and everything else loads
+// normally.
+//
+//   node code_cache.js <generated package dir>...
+//   require('.../code_cache.js').install();
+//-----------------------------------------------------------------------------
+
+let crypto = require('crypto');
+let fs = require('fs');
+let path = require('path');
+let vm = require('vm');
+let Module = require('module');
+
+const MANIFEST = '_code_cache.json';
+const SUFFIX = '.cache';
+
+let hashSource = function(source) {
+  return crypto.createHash('sha256').update(source).digest('hex');
+}
+
+let runtimeInfo = function() {
+  return {
+    node: process.version,
+    v8: process.versions.v8,
+    arch: process.arch
+  };
+}
+
+let makeRequire = function(module) {
+  let require_ = function(id) {
+    return module.require(id);
+  };
+  require_.resolve = function(request, options) {
+    return Module._resolveFilename(request, module, false, options);
+  };
+  require_.main = require.main;
+  require_.cache = Module._cache;
+  return require_;
+}
+
+// Runs a compiled module wrapper the way require() would
+let runWrapper = function(script, module, filename) {
+  let wrapper = script.runInThisContext({displayErrors: true});
+  wrapper.call(module.exports, module.exports, makeRequire(module), module,
+               filename, path.dirname(filename));
+}
+
+//-----------------------------------------------------------------------------
+// Cache generation
+//-----------------------------------------------------------------------------
+
+// Returns the message classes a module exports - the class itself for
+// messages, Request and Response for services
+let exportedClasses = function(exports) {
+  let candidates = typeof exports === 'function' ? [exports] : [];
+  if (typeof exports === 'object' && exports !== null) {
+    candidates = Object.keys(exports).map((key) => exports[key]);
+  }
+  return candidates.filter((Msg) => {
+    return typeof Msg === 'function' && typeof Msg.serialize === 'function' &&
+           typeof Msg.deserialize === 'function';
+  });
+}
+
+// Round trips a default instance of each class so that V8 compiles the
+// (de)serializers before the cache is created. Classes whose defaults do
+// not serialize just leave those functions out of the cache.
+let warmUp = function(exports) {
+  exportedClasses(exports).forEach((Msg) => {
+    try {
+      let bufferInfo = Msg.serialize(new Msg(), {buffer: [], length: 0});
+      let buffer = Buffer.concat(bufferInfo.buffer, bufferInfo.length);
+      Msg.deserialize(buffer);
+      if (typeof Msg.deserializeFields === 'function') {
+        Msg.deserializeFields(buffer, []);
+      }
+      if (typeof Msg.skip === 'function') {
+        Msg.skip(buffer);
+      }
+      if (typeof Msg.toJSONString === 'function') {
+        Msg.toJSONString(buffer);
+      }
+    }
+    catch (err) {
+      // nothing to do - the functions compile lazily at runtime instead
+    }
+  });
+}
+
+let buildDirectory = function(dir) {
+  let files = {};
+  // drop caches left over from modules that no longer exist
+  fs.readdirSync(dir).filter((name) => name.endsWith('.js' + SUFFIX)).forEach((name) => {
+    fs.unlinkSync(path.join(dir, name));
+  });
+  fs.readdirSync(dir).forEach((name) => {
+    let filename = path.join(dir, name);
+    if (fs.statSync(filename).isDirectory()) {
+      buildDirectory(filename);
+      return;
+    }
+    else if (path.extname(name) !== '.js') {
+      return;
+    }
+    // else
+    let source = fs.readFileSync(filename, 'utf8');
+    let script = new vm.Script(Module.wrap(source), {filename: filename});
+    // V8 compiles functions lazily and the cache only holds functions that
+    // have been compiled, so load the module and run its message classes
+    // first. Otherwise the cache would cover little more than the wrapper.
+    let module = new Module(filename, null);
+    module.filename = filename;
+    module.paths = Module._nodeModulePaths(dir);
+    try {
+      runWrapper(script, module, filename);
+      warmUp(module.exports);
+    }
+    catch (err) {
+      // still usable, the cache just covers less of the module
+      console.error('code_cache: could not load %s: %s', filename, err.message);
+    }
+    fs.writeFileSync(filename + SUFFIX, script.createCachedData());
+    files[name] = hashSource(source);
+  });
+  let manifest = runtimeInfo();
+  manifest.files = files;
+  fs.writeFileSync(path.join(dir, MANIFEST), JSON.stringify(manifest, null, 2));
+}
+
+let build = function(dirs) {
+  [].concat(dirs).forEach((dir) => buildDirectory(path.resolve(dir)));
+}
+
+//-----------------------------------------------------------------------------
+// Cache loading
+//-----------------------------------------------------------------------------
+
+let manifests = new Map();
+let stats = {hits: 0, misses: 0, rejected: 0};
+
+// Returns the manifest for a directory if it was built by this node
+// version, or null
+let getManifest = function(dir) {
+  let manifest = manifests.get(dir);
+  if (manifest !== undefined) {
+    return manifest;
+  }
+  // else
+  manifest = null;
+  try {
+    let found = JSON.parse(fs.readFileSync(path.join(dir, MANIFEST), 'utf8'));
+    let info = runtimeInfo();
+    if (found.node === info.node && found.v8 === info.v8 && found.arch === info.arch) {
+      manifest = found;
+    }
+  }
+  catch (err) {
+    // no usable manifest - modules in this directory load normally
+  }
+  manifests.set(dir, manifest);
+  return manifest;
+}
+
+let installed = null;
+
+let install = function() {
+  if (installed !== null) {
+    return;
+  }
+  // else
+  installed = Module._extensions['.js'];
+  Module._extensions['.js'] = function(module, filename) {
+    let manifest = getManifest(path.dirname(filename));
+    let name = path.basename(filename);
+    if (manifest === null || !manifest.files.hasOwnProperty(name)) {
+      return installed(module, filename);
+    }
+    // else
+    let source = fs.readFileSync(filename, 'utf8');
+    if (hashSource(source) !== manifest.files[name]) {
+      ++stats.misses;
+      return module._compile(source, filename);
+    }
+    // else
+    let cachedData;
+    try {
+      cachedData = fs.readFileSync(filename + SUFFIX);
+    }
+    catch (err) {
+      ++stats.misses;
+      return module._compile(source, filename);
+    }
+    let script = new vm.Script(Module.wrap(source), {
+      filename: filename,
+      cachedData: cachedData
+    });
+    if (script.cachedDataRejected) {
+      // V8 compiled the source from scratch instead
+      ++stats.rejected;
+    }
+    else {
+      ++stats.hits;
+    }
+    runWrapper(script, module, filename);
+  };
+}
+
+let uninstall = function() {
+  if (installed !== null) {
+    Module._extensions['.js'] = installed;
+    installed = null;
+  }
+  manifests.clear();
+}
+
+//-----------------------------------------------------------------------------
+
+if (require.main === module) {
+  if (process.argv.length < 3) {
+    console.error('usage: code_cache.js <generated package dir>...');
+    process.exit(1);
+  }
+  build(process.argv.slice(2));
+}
+
+module.exports = {
+  build: build,
+  install: install,
+  uninstall: uninstall,
+  stats: stats
+};
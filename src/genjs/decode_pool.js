@@ -0,0 +1,442 @@
+/*
+ *    Copyright 2016 Rethink Robotics
+ *
+ *    Copyright 2016 Chris Smith
+ *
+ *    Licensed under the Apache License, Version 2.0 (the "License");
+ *    you may not use this file except in compliance with the License.
+ *    You may obtain a copy of the License at
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *    Unless required by applicable law or agreed to in writing, software
+ *    distributed under the License is distributed on an "AS IS" BASIS,
+ *    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *    See the License for the specific language governing permissions and
+ *    limitations under the License.
+ */
+
+'use strict';
+
+//-----------------------------------------------------------------------------
+// Worker thread decode pool
+//
+// Decodes messages above a size threshold on worker threads so that large
+// PointCloud2, Image or OccupancyGrid messages don't block the event loop.
+// Smaller messages are decoded inline. Results for each topic are delivered
+// in the order the messages were submitted.
+//
+//   let pool = new DecodePool({threshold: 1 << 20});
+//   pool.decode('/points', sensor_msgs.msg.PointCloud2, buffer).then(...);
+//
+// Message data is shared with the workers through a SharedArrayBuffer, so
+// Buffer fields of the result (e.g. uint8[] data) are views of that memory
+// rather than copies, and TypedArrays created by a worker are transferred
+// back. Structured cloning drops class prototypes, so results from workers
+// are rebuilt into instances of Msg and its nested classes, the same shape
+// deserialize() gives for messages decoded inline. Classes whose definition
+// doesn't resolve to generated or compiled classes get plain objects.
+//-----------------------------------------------------------------------------
+
+let os = require('os');
+let worker_threads = require('worker_threads');
+let compiler = require('./msg_compiler.js');
+
+//-----------------------------------------------------------------------------
+// Worker side
+//-----------------------------------------------------------------------------
+
+let collectTransferables = function(val, transfer) {
+  if (ArrayBuffer.isView(val)) {
+    // only transfer memory the view owns - never SharedArrayBuffers or
+    // slices of a larger allocation such as the Buffer pool
+    if (val.buffer instanceof ArrayBuffer && val.byteLength === val.buffer.byteLength &&
+        transfer.indexOf(val.buffer) < 0) {
+      transfer.push(val.buffer);
+    }
+  }
+  else if (Array.isArray(val)) {
+    for (let i = 0; i < val.length; ++i) {
+      if (typeof val[i] === 'object' && val[i] !== null) {
+        collectTransferables(val[i], transfer);
+      }
+    }
+  }
+  else if (typeof val === 'object' && val !== null) {
+    for (let key in val) {
+      if (typeof val[key] === 'object' && val[key] !== null) {
+        collectTransferables(val[key], transfer);
+      }
+    }
+  }
+  return transfer;
+}
+
+let runWorker = function() {
+  let classes = {};
+
+  worker_threads.parentPort.on('message', (msg) => {
+    if (msg.register) {
+      // prefer the generated class, fall back on compiling the definition
+      let [pkg, name] = msg.datatype.split('/');
+      let Msg;
+      try {
+        Msg = require('./find.js')(pkg).msg[name];
+      }
+      catch (err) {
+        Msg = undefined;
+      }
+      if (Msg === undefined || Msg.md5sum() !== msg.md5sum) {
+        try {
+          Msg = compiler.compile(msg.datatype, msg.definition, msg.md5sum);
+        }
+        catch (err) {
+          // keep the worker alive and fail every job for this type instead
+          Msg = err;
+        }
+      }
+      classes[msg.key] = Msg;
+      return;
+    }
+    // else
+    if (classes[msg.key] instanceof Error) {
+      worker_threads.parentPort.postMessage({id: msg.id, error: classes[msg.key].message});
+      return;
+    }
+    // else
+    try {
+      let buffer = Buffer.from(msg.memory, msg.byteOffset, msg.length);
+      let data = classes[msg.key].deserialize(buffer).data;
+      worker_threads.parentPort.postMessage({id: msg.id, data: data},
+                                            collectTransferables(data, []));
+    }
+    catch (err) {
+      worker_threads.parentPort.postMessage({id: msg.id, error: err.message});
+    }
+  });
+}
+
+//-----------------------------------------------------------------------------
+// Main thread side
+//-----------------------------------------------------------------------------
+
+// Structured cloning turns Buffers into plain Uint8Arrays - wrap them back
+// up without copying the underlying memory
+let restoreBuffers = function(val) {
+  if (val instanceof Uint8Array) {
+    return Buffer.isBuffer(val) ? val : Buffer.from(val.buffer, val.byteOffset, val.length);
+  }
+  else if (ArrayBuffer.isView(val)) {
+    return val;
+  }
+  else if (Array.isArray(val)) {
+    for (let i = 0; i < val.length; ++i) {
+      if (typeof val[i] === 'object' && val[i] !== null) {
+        val[i] = restoreBuffers(val[i]);
+      }
+    }
+  }
+  else if (typeof val === 'object' && val !== null) {
+    for (let key in val) {
+      if (typeof val[key] === 'object' && val[key] !== null) {
+        val[key] = restoreBuffers(val[key]);
+      }
+    }
+  }
+  return val;
+}
+
+// Returns the class Msg uses for a nested type - generated classes load
+// their dependencies through find.js, compiled ones from the compiler
+let nestedClass = function(Msg, type) {
+  let [pkg, name] = Msg.datatype().split('/');
+  let generated = false;
+  try {
+    generated = require('./find.js')(pkg).msg[name] === Msg;
+  }
+  catch (err) {
+    // not a generated package
+  }
+  if (generated) {
+    [pkg, name] = type.split('/');
+    return require('./find.js')(pkg).msg[name];
+  }
+  // else
+  return compiler.dependency(Msg, type);
+}
+
+// Plans for rebuilding worker results into message instances, per class
+let plans = new WeakMap();
+
+let getPlan = function(Msg, type, specs, Root) {
+  let plan = plans.get(Msg);
+  if (plan === null) {
+    throw new Error('No rebuild plan for ' + Msg.datatype());
+  }
+  else if (plan !== undefined) {
+    return plan;
+  }
+  // else
+  if (specs === undefined) {
+    type = Msg.datatype();
+    specs = compiler.parseDefinition(type, Msg.messageDefinition());
+    Root = Msg;
+  }
+  plan = {Msg: Msg, fields: []};
+  specs[type].fields.forEach((f) => {
+    plan.fields.push({
+      name: f.name,
+      isArray: f.isArray,
+      nested: f.isBuiltin ? null : getPlan(nestedClass(Root, f.baseType), f.baseType, specs, Root)
+    });
+  });
+  plans.set(Msg, plan);
+  return plan;
+}
+
+// Returns the plan for Msg, or null if its definition can't be resolved to
+// classes (e.g. a hand-written class), in which case results stay plain
+let planFor = function(Msg) {
+  try {
+    return getPlan(Msg);
+  }
+  catch (err) {
+    plans.set(Msg, null);
+    return null;
+  }
+}
+
+let rebuild = function(plan, val) {
+  let data = new plan.Msg(null);
+  plan.fields.forEach((f) => {
+    let fieldVal = val[f.name];
+    if (f.nested === null || fieldVal === null || fieldVal === undefined) {
+      data[f.name] = fieldVal;
+    }
+    else if (f.isArray) {
+      // columnar fields decode to objects of TypedArrays - keep those as is
+      data[f.name] = Array.isArray(fieldVal) ? fieldVal.map((elem) => rebuild(f.nested, elem))
+                                             : fieldVal;
+    }
+    else {
+      data[f.name] = rebuild(f.nested, fieldVal);
+    }
+  });
+  return data;
+}
+
+let toSharedMemory = function(buffer) {
+  if (buffer.buffer instanceof SharedArrayBuffer) {
+    return {memory: buffer.buffer, byteOffset: buffer.byteOffset};
+  }
+  // else
+  let memory = new SharedArrayBuffer(buffer.length);
+  buffer.copy(Buffer.from(memory));
+  return {memory: memory, byteOffset: 0};
+}
+
+class DecodePool {
+  constructor(options={}) {
+    this.threshold = options.threshold !== undefined ? options.threshold : 1 << 20;
+    this.size = options.workers || Math.max(os.cpus().length - 1, 1);
+    this.workers = [];
+    this.inflight = new Map();
+    this.topics = new Map();
+    this.nextId = 0;
+    this.decodedInline = 0;
+    this.decodedInWorkers = 0;
+    this.closed = false;
+    for (let i = 0; i < this.size; ++i) {
+      this.workers.push(this._spawn());
+    }
+  }
+
+  _spawn() {
+    let worker = new worker_threads.Worker(__filename, {workerData: {genjsDecodePool: true}});
+    let state = {worker: worker, registered: new Set(), pending: 0};
+    worker.on('message', (msg) => {
+      let job = this.inflight.get(msg.id);
+      if (job === undefined) {
+        // already failed by close()
+        return;
+      }
+      // else
+      this.inflight.delete(msg.id);
+      if (--state.pending === 0) {
+        // let the process exit while the worker is idle
+        worker.unref();
+      }
+      if (msg.error !== undefined) {
+        this._finish(job, new Error(msg.error));
+        return;
+      }
+      // else
+      let data = restoreBuffers(msg.data);
+      let plan = planFor(job.Msg);
+      if (plan !== null) {
+        data = rebuild(plan, data);
+      }
+      ++this.decodedInWorkers;
+      this._finish(job, null, data);
+    });
+    worker.on('error', (err) => this._retire(state, err));
+    worker.on('exit', (code) => {
+      this._retire(state, new Error('decode worker exited with code ' + code));
+    });
+    worker.unref();
+    return state;
+  }
+
+  _retire(state, err) {
+    // fail everything the worker was handling and replace it. An 'error' is
+    // followed by an 'exit', so only the first one counts
+    if (state.dead) {
+      return;
+    }
+    // else
+    state.dead = true;
+    this._failJobs((job) => job.worker === state, err);
+    let idx = this.workers.indexOf(state);
+    if (idx >= 0 && !this.closed) {
+      this.workers[idx] = this._spawn();
+    }
+  }
+
+  _failJobs(filter, err) {
+    this.inflight.forEach((job, id) => {
+      if (filter(job)) {
+        this.inflight.delete(id);
+        this._finish(job, err);
+      }
+    });
+  }
+
+  _finish(job, error, data) {
+    job.done = true;
+    job.error = error;
+    job.data = data;
+    // deliver completed results from the head of the topic queue so each
+    // topic sees its messages in submission order
+    let queue = this.topics.get(job.topic);
+    while (queue.length > 0 && queue[0].done) {
+      let head = queue.shift();
+      if (head.error) {
+        head.reject(head.error);
+      }
+      else {
+        head.resolve(head.data);
+      }
+    }
+    if (queue.length === 0) {
+      this.topics.delete(job.topic);
+    }
+  }
+
+  decode(topic, Msg, buffer) {
+    if (this.closed) {
+      return Promise.reject(new Error('DecodePool is closed'));
+    }
+    // else
+    let queue = this.topics.get(topic);
+    if (buffer.length < this.threshold && queue === undefined) {
+      try {
+        let data = Msg.deserialize(buffer).data;
+        ++this.decodedInline;
+        return Promise.resolve(data);
+      }
+      catch (err) {
+        return Promise.reject(err);
+      }
+    }
+    // else
+    if (queue === undefined) {
+      queue = [];
+      this.topics.set(topic, queue);
+    }
+    let job = {topic: topic, done: false};
+    let promise = new Promise((resolve, reject) => {
+      job.resolve = resolve;
+      job.reject = reject;
+    });
+    queue.push(job);
+    if (buffer.length < this.threshold) {
+      // small, but has to wait behind larger messages on the same topic
+      let data;
+      try {
+        data = Msg.deserialize(buffer).data;
+      }
+      catch (err) {
+        this._finish(job, err);
+        return promise;
+      }
+      ++this.decodedInline;
+      this._finish(job, null, data);
+      return promise;
+    }
+    // else
+    let state = this.workers.reduce((a, b) => b.pending < a.pending ? b : a);
+    let key = Msg.datatype() + ':' + Msg.md5sum();
+    if (!state.registered.has(key)) {
+      state.worker.postMessage({register: true, key: key, datatype: Msg.datatype(),
+                                md5sum: Msg.md5sum(), definition: Msg.messageDefinition()});
+      state.registered.add(key);
+    }
+    let shared = toSharedMemory(buffer);
+    let id = this.nextId++;
+    job.worker = state;
+    job.Msg = Msg;
+    this.inflight.set(id, job);
+    if (state.pending++ === 0) {
+      state.worker.ref();
+    }
+    state.worker.postMessage({id: id, key: key, memory: shared.memory,
+                              byteOffset: shared.byteOffset, length: buffer.length});
+    return promise;
+  }
+
+  queueDepth(topic) {
+    // Returns the number of undelivered messages for a topic, or for all
+    // topics if none is given
+    if (topic !== undefined) {
+      let queue = this.topics.get(topic);
+      return queue ? queue.length : 0;
+    }
+    // else
+    let depth = 0;
+    this.topics.forEach((queue) => {
+      depth += queue.length;
+    });
+    return depth;
+  }
+
+  stats() {
+    let topics = {};
+    this.topics.forEach((queue, topic) => {
+      topics[topic] = queue.length;
+    });
+    return {
+      queueDepth: this.queueDepth(),
+      inflight: this.inflight.size,
+      topics: topics,
+      workers: this.workers.map((state) => state.pending),
+      decodedInline: this.decodedInline,
+      decodedInWorkers: this.decodedInWorkers
+    };
+  }
+
+  close() {
+    this.closed = true;
+    // every undelivered job is either done or waiting on a worker, so this
+    // settles all queued promises
+    this._failJobs(() => true, new Error('DecodePool is closed'));
+    return Promise.all(this.workers.map((state) => state.worker.terminate()));
+  }
+}
+
+//-----------------------------------------------------------------------------
+
+if (!worker_threads.isMainThread && worker_threads.workerData &&
+    worker_threads.workerData.genjsDecodePool) {
+  runWorker();
+}
+
+module.exports = DecodePool;
@@ -77,13 +77,13 @@ def get_typed_array(t):
     if t in ['int8', 'byte', 'bool']:
         return 'Int8Array'
     elif t in ['uint8', 'char']:
-        return 'UInt8Array'
+        return 'Uint8Array'
     elif t == 'uint16':
-        return 'UInt16Array'
+        return 'Uint16Array'
     elif t == 'int16':
         return 'Int16Array'
     elif t == 'uint32':
-        return 'UInt32Array'
+        return 'Uint32Array'
     elif t == 'int32':
         return 'Int32Array'
     elif t == 'float32':
@@ -99,7 +99,73 @@ def has_typed_array(t):
 
 NUM_BYTES = {'int8': 1, 'int16': 2, 'int32': 4, 'int64': 8,
              'uint8': 1, 'uint16': 2, 'uint32': 4, 'uint64': 8,
-             'byte': 1, 'bool': 1, 'char': 1, 'float32': 4, 'float64': 4}
+             'byte': 1, 'bool': 1, 'char': 1, 'float32': 4, 'float64': 8,
+             'time': 8, 'duration': 8}
+
+# Suffixes of the Buffer read/write methods for each numeric type
+BUFFER_METHODS = {'int8': 'Int8', 'int16': 'Int16LE', 'int32': 'Int32LE',
+                  'uint8': 'UInt8', 'uint16': 'UInt16LE', 'uint32': 'UInt32LE',
+                  'byte': 'Int8', 'char': 'UInt8', 'float32': 'FloatLE', 'float64': 'DoubleLE'}
+
+def get_type_fixed_size(msg_context, t):
+    "Returns the serialized size of a single value of type t, or None if it varies"
+    if t in NUM_BYTES:
+        return NUM_BYTES[t]
+    elif is_string(t):
+        return None
+    # else
+    return get_fixed_size(msg_context, msg_context.get_registered(t))
+
+def get_fixed_size(msg_context, spec):
+    "Returns the serialized size of a message, or None if it varies"
+    size = 0
+    for field in spec.parsed_fields():
+        if field.is_array and not field.array_len:
+            return None
+        field_size = get_type_fixed_size(msg_context, field.base_type)
+        if field_size is None:
+            return None
+        size += field_size * (field.array_len or 1)
+    return size
+
+def get_columns(msg_context, spec, prefix=(), offset=0):
+    """
+    Returns a (path, type, offset) tuple for every leaf field of a message
+    that can be decoded into a TypedArray column, or None if any leaf can't
+    """
+    columns = []
+    for field in spec.parsed_fields():
+        path = prefix + (field.name,)
+        if field.is_array:
+            return None
+        elif field.is_builtin:
+            if field.base_type not in BUFFER_METHODS:
+                return None
+            columns.append((path, field.base_type, offset))
+            offset += NUM_BYTES[field.base_type]
+        else:
+            field_spec = msg_context.get_registered(field.base_type)
+            nested = get_columns(msg_context, field_spec, path, offset)
+            if nested is None:
+                return None
+            columns.extend(nested)
+            offset += get_fixed_size(msg_context, field_spec)
+    return columns
+
+def get_columnar_fields(msg_context, spec):
+    """
+    Finds the fields of a message that are arrays of small fixed-size
+    messages, which columnar mode decodes into one TypedArray per leaf field
+    @return: dict of field name to (columns, element size)
+    """
+    columnar_fields = {}
+    for field in spec.parsed_fields():
+        if field.is_array and not field.is_builtin:
+            field_spec = msg_context.get_registered(field.base_type)
+            columns = get_columns(msg_context, field_spec)
+            if columns:
+                columnar_fields[field.name] = (columns, get_fixed_size(msg_context, field_spec))
+    return columnar_fields
 
 def get_default_value(field, current_message_package):
     if field.is_array:
@@ -225,13 +291,15 @@ def write_begin(s, spec, is_service=False):
     suffix = 'srv' if is_service else 'msg'
     s.write('// (in-package %s.%s)\n\n'%(spec.package, suffix), newline=False)
 
-def write_requires(s, spec, previous_packages=None, prev_deps=None, isSrv=False):
+def write_requires(s, spec, previous_packages=None, prev_deps=None, isSrv=False, emit_json=False):
     "Writes out the require fields"
     if previous_packages is None:
         s.write('"use strict";')
         s.newline()
         s.write('let _serializer = require(\'../../../base_serialize.js\');')
         s.write('let _deserializer = require(\'../../../base_deserialize.js\');')
+        if emit_json:
+            s.write('let _json = require(\'../../../base_json.js\');')
         s.write('let _finder = require(\'../../../find.js\');')
         previous_packages = {}
     if prev_deps is None:
@@ -264,15 +332,31 @@ def write_requires(s, spec, previous_packages=None, prev_deps=None, isSrv=False)
     return found_packages, local_deps
 
 def write_msg_constructor_field(s, spec, field):
-    s.write('this.{} = {};'.format(field.name, get_default_value(field, spec.package)))
+    s.write('if (initObj.hasOwnProperty(\'{}\')) {{'.format(field.name))
+    with Indent(s):
+        s.write('this.{0} = initObj.{0};'.format(field.name))
+    s.write('} else {')
+    with Indent(s):
+        s.write('this.{} = {};'.format(field.name, get_default_value(field, spec.package)))
+    s.write('}')
 
 def write_class(s, spec):
     s.write('class {} {{'.format(spec.actual_name))
     with Indent(s):
-        s.write('constructor() {')
+        s.write('constructor(initObj={}) {')
         with Indent(s):
-            for field in spec.parsed_fields():
-                write_msg_constructor_field(s, spec, field)
+            # every path assigns every field in declaration order so that all
+            # instances, constructed or deserialized, share one hidden class
+            s.write('if (initObj === null) {')
+            with Indent(s):
+                s.write('// initObj === null is a special case for deserialization where we don\'t initialize fields')
+                for field in spec.parsed_fields():
+                    s.write('this.{} = null;'.format(field.name))
+            s.write('} else {')
+            with Indent(s):
+                for field in spec.parsed_fields():
+                    write_msg_constructor_field(s, spec, field)
+            s.write('}')
         s.write('}')
     s.newline()
 
@@ -323,6 +407,38 @@ def write_serialize_complex(s, f, thisPackage):
         else:
             write_serialize_base(s, '{}.msg.{}.serialize(obj.{}, bufferInfo)'.format(package, msg_type, f.name))
 
+def column_offset(offset):
+    return 'offset + {}'.format(offset) if offset else 'offset'
+
+# adds function to serialize an array of messages given as TypedArray columns
+def write_serialize_columns(s, f, columns, size):
+    for (i, (path, t, offset)) in enumerate(columns):
+        s.write('let col{} = obj.{};'.format(i, '.'.join((f.name,) + path)))
+    s.write('let len = col0.length;')
+    if len(columns) > 1:
+        s.write('if ({}) {{'.format(' || '.join('col{}.length !== len'.format(i)
+                                                  for i in range(1, len(columns)))))
+        with Indent(s):
+            s.write('throw new Error(\'Columns of message field [{}] have different lengths\');'.format(f.name))
+        s.write('}')
+    if f.array_len:
+        s.write('if (len !== {}) {{'.format(f.array_len))
+        with Indent(s):
+            s.write('throw new Error(\'Message field [{}] needs {} elements, columns have \' + len);'.format(f.name, f.array_len))
+        s.write('}')
+    else:
+        s.write('// Serialize the length for message field [{}]'.format(f.name))
+        write_serialize_base(s, '_serializer.uint32(len, bufferInfo)')
+    s.write('// Serialize message field [{}] from columns'.format(f.name))
+    s.write('let buf = new Buffer(len * {});'.format(size))
+    s.write('for (let i = 0, offset = 0; i < len; ++i, offset += {}) {{'.format(size))
+    with Indent(s):
+        for (i, (path, t, offset)) in enumerate(columns):
+            s.write('buf.write{}(col{}[i], {});'.format(BUFFER_METHODS[t], i, column_offset(offset)))
+    s.write('}')
+    s.write('bufferInfo.buffer.push(buf);')
+    s.write('bufferInfo.length += buf.length;')
+
 # writes serialization for a single field in the message
 def write_serialize_field(s, f, package):
     if f.is_array:
@@ -335,7 +451,7 @@ def write_serialize_field(s, f, package):
     else:
         write_serialize_complex(s, f, package)
 
-def write_serialize(s, spec):
+def write_serialize(s, spec, columnar_fields={}):
     """
     Write the serialize method
     """
@@ -344,7 +460,17 @@ def write_serialize(s, spec):
         with Indent(s):
             s.write('// Serializes a message object of type {}'.format(spec.short_name))
             for f in spec.parsed_fields():
-                write_serialize_field(s, f, spec.package)
+                if f.name in columnar_fields:
+                    # accept both arrays of messages and columns
+                    s.write('if (Array.isArray(obj.{})) {{'.format(f.name))
+                    with Indent(s):
+                        write_serialize_field(s, f, spec.package)
+                    s.write('} else {')
+                    with Indent(s):
+                        write_serialize_columns(s, f, *columnar_fields[f.name])
+                    s.write('}')
+                else:
+                    write_serialize_field(s, f, spec.package)
             s.write('return bufferInfo;')
         s.write('}')
         s.newline()
@@ -356,7 +482,7 @@ def write_deserialize_length(s, name):
     s.write('len = tmp.data;')
     s.write('buffer = tmp.buffer;')
 
-def write_deserialize_complex(s, f, thisPackage):
+def write_deserialize_complex(s, f, thisPackage, call='deserialize(buffer)'):
     (package, msg_type) = f.base_type.split('/')
     samePackage = package == thisPackage
     if f.is_array:
@@ -364,17 +490,17 @@ def write_deserialize_complex(s, f, thisPackage):
         s.write('for (let i = 0; i < len; ++i) {')
         with Indent(s):
             if samePackage:
-                s.write('tmp = {}.deserialize(buffer);'.format(msg_type))
+                s.write('tmp = {}.{};'.format(msg_type, call))
             else:
-                s.write('tmp = {}.msg.{}.deserialize(buffer);'.format(package, msg_type))
+                s.write('tmp = {}.msg.{}.{};'.format(package, msg_type, call))
             s.write('data.{}[i] = tmp.data;'.format(f.name))
             s.write('buffer = tmp.buffer;')
         s.write('}')
     else:
         if samePackage:
-            s.write('tmp = {}.deserialize(buffer);'.format(msg_type))
+            s.write('tmp = {}.{};'.format(msg_type, call))
         else:
-            s.write('tmp = {}.msg.{}.deserialize(buffer);'.format(package, msg_type))
+            s.write('tmp = {}.msg.{}.{};'.format(package, msg_type, call))
         s.write('data.{} = tmp.data;'.format(f.name))
         s.write('buffer = tmp.buffer;')
 
@@ -398,21 +524,60 @@ def write_deserialize_builtin(s, f):
         s.write('buffer = tmp.buffer;')
 
 
-def write_deserialize_field(s, f, package):
+def write_column_tree(s, paths, depth=0):
+    "Writes the nested object literal holding the column variables"
+    names = []
+    for (i, path) in paths:
+        if path[depth] not in names:
+            names.append(path[depth])
+    for name in names:
+        children = [(i, path) for (i, path) in paths if path[depth] == name]
+        if len(children) == 1 and len(children[0][1]) == depth + 1:
+            s.write('{}: col{},'.format(name, children[0][0]))
+        else:
+            s.write('{}: {{'.format(name))
+            with Indent(s):
+                write_column_tree(s, children, depth + 1)
+            s.write('},')
+
+def write_deserialize_columns(s, f, columns, size):
+    for (i, (path, t, offset)) in enumerate(columns):
+        s.write('let col{} = new {}(len);'.format(i, get_typed_array(t)))
+    s.write('for (let i = 0, offset = 0; i < len; ++i, offset += {}) {{'.format(size))
+    with Indent(s):
+        for (i, (path, t, offset)) in enumerate(columns):
+            s.write('col{}[i] = buffer.read{}({});'.format(i, BUFFER_METHODS[t], column_offset(offset)))
+    s.write('}')
+    s.write('data.{} = {{'.format(f.name))
+    with Indent(s):
+        write_column_tree(s, [(i, path) for (i, (path, t, offset)) in enumerate(columns)])
+    s.write('};')
+    s.write('buffer = buffer.slice(len * {});'.format(size))
+
+def write_deserialize_field(s, f, package, call='deserialize(buffer)', columnar=None):
     if f.is_array:
         if not f.array_len:
             write_deserialize_length(s, f.name)
         else:
             s.write('len = {};'.format(f.array_len))
 
+    if columnar:
+        s.write('// Deserialize message field [{}] into columns'.format(f.name))
+        # scope the column variables to this field
+        s.write('{')
+        with Indent(s):
+            write_deserialize_columns(s, f, *columnar)
+        s.write('}')
+        return
+    # else
     s.write('// Deserialize message field [{}]'.format(f.name))
     if f.is_builtin:
         write_deserialize_builtin(s, f)
     else:
-        write_deserialize_complex(s, f, package)
+        write_deserialize_complex(s, f, package, call)
 
 
-def write_deserialize(s, spec):
+def write_deserialize(s, spec, columnar_fields={}):
     """
     Write the deserialize method
     """
@@ -422,9 +587,121 @@ def write_deserialize(s, spec):
             s.write('//deserializes a message object of type {}'.format(spec.short_name))
             s.write('let tmp;')
             s.write('let len;')
-            s.write('let data = {};')
+            s.write('let data = new {}(null);'.format(spec.actual_name))
+            for f in spec.parsed_fields():
+                write_deserialize_field(s, f, spec.package, columnar=columnar_fields.get(f.name))
+
+            s.write('return {')
+            with Indent(s):
+                s.write('data: data,')
+                s.write('buffer: buffer')
+            s.write('}')
+        s.write('}')
+        s.newline()
+
+def write_skip_step(s, f, thisPackage):
+    "Skips a single variable-length value of the field's base type"
+    if f.is_builtin:
+        s.write('offset += 4 + buffer.readUInt32LE(offset);')
+        return
+    # else
+    (package, msg_type) = f.base_type.split('/')
+    if package == thisPackage:
+        s.write('offset = {}.skip(buffer, offset);'.format(msg_type))
+    else:
+        s.write('offset = {}.msg.{}.skip(buffer, offset);'.format(package, msg_type))
+
+def write_skip_field(s, f, package, msg_context):
+    s.write('// Skip message field [{}]'.format(f.name))
+    size = get_type_fixed_size(msg_context, f.base_type)
+    if not f.is_array:
+        if size is not None:
+            s.write('offset += {};'.format(size))
+        else:
+            write_skip_step(s, f, package)
+    elif size is not None:
+        if f.array_len:
+            s.write('offset += {};'.format(size * f.array_len))
+        elif size == 1:
+            s.write('offset += 4 + buffer.readUInt32LE(offset);')
+        else:
+            s.write('offset += 4 + {} * buffer.readUInt32LE(offset);'.format(size))
+    else:
+        if f.array_len:
+            s.write('len = {};'.format(f.array_len))
+        else:
+            s.write('len = buffer.readUInt32LE(offset);')
+            s.write('offset += 4;')
+        s.write('for (let i = 0; i < len; ++i) {')
+        with Indent(s):
+            write_skip_step(s, f, package)
+        s.write('}')
+
+def write_skip(s, msg_context, spec):
+    """
+    Write the skip method, which steps over a serialized message without
+    decoding it
+    """
+    with Indent(s):
+        s.write('static skip(buffer, offset=0) {')
+        with Indent(s):
+            s.write('// Returns the offset just past a serialized message object of type {}'.format(spec.short_name))
+            size = get_fixed_size(msg_context, spec)
+            if size is not None:
+                s.write('return offset + {};'.format(size))
+            else:
+                s.write('let len;')
+                for f in spec.parsed_fields():
+                    write_skip_field(s, f, spec.package, msg_context)
+                s.write('return offset;')
+        s.write('}')
+        s.newline()
+
+def write_deserialize_fields(s, msg_context, spec, columnar_fields={}):
+    """
+    Write the deserializeFields method, which only decodes the fields
+    selected by a field mask and skips over the rest
+    """
+    with Indent(s):
+        s.write('static deserializeFields(buffer, fields) {')
+        with Indent(s):
+            s.write('//deserializes selected fields of a message object of type {}'.format(spec.short_name))
+            s.write('if (fields === undefined || fields === null) {')
+            with Indent(s):
+                s.write('// no mask selects every field')
+                s.write('return {}.deserialize(buffer);'.format(spec.actual_name))
+            s.write('}')
+            s.write('fields = _deserializer.fieldMask(fields);')
+            s.write('let tmp;')
+            s.write('let len;')
+            s.write('let offset;')
+            s.write('let data = new {}(null);'.format(spec.actual_name))
             for f in spec.parsed_fields():
-                write_deserialize_field(s, f, spec.package)
+                if f.name in columnar_fields:
+                    # columns are always decoded in full
+                    s.write('if (fields.{}) {{'.format(f.name))
+                    with Indent(s):
+                        write_deserialize_field(s, f, spec.package, columnar=columnar_fields[f.name])
+                elif f.is_builtin:
+                    # builtins can't be split, so any mask selects the whole field
+                    s.write('if (fields.{}) {{'.format(f.name))
+                    with Indent(s):
+                        write_deserialize_field(s, f, spec.package)
+                else:
+                    s.write('if (fields.{} === true) {{'.format(f.name))
+                    with Indent(s):
+                        write_deserialize_field(s, f, spec.package)
+                    # nested masks select fields of the sub-message
+                    s.write('}} else if (fields.{}) {{'.format(f.name))
+                    with Indent(s):
+                        write_deserialize_field(s, f, spec.package,
+                            'deserializeFields(buffer, fields.{})'.format(f.name))
+                s.write('} else {')
+                with Indent(s):
+                    s.write('offset = 0;')
+                    write_skip_field(s, f, spec.package, msg_context)
+                    s.write('buffer = buffer.slice(offset);')
+                s.write('}')
 
             s.write('return {')
             with Indent(s):
@@ -434,6 +711,96 @@ def write_deserialize(s, spec):
         s.write('}')
         s.newline()
 
+def write_to_json_advance(s, t):
+    if is_string(t):
+        s.write('bufferOffset[0] += 4 + buffer.readUInt32LE(bufferOffset[0]);')
+    else:
+        s.write('bufferOffset[0] += {};'.format(NUM_BYTES[t]))
+
+def write_to_json_length(s, name):
+    s.write('// Transcode array length for message field [{}]'.format(name))
+    s.write('len = buffer.readUInt32LE(bufferOffset[0]);')
+    s.write('bufferOffset[0] += 4;')
+
+def write_to_json_complex(s, f, key, thisPackage):
+    (package, msg_type) = f.base_type.split('/')
+    if package == thisPackage:
+        transcode = '{}.toJSONString(buffer, bufferOffset, options)'.format(msg_type)
+    else:
+        # other packages may have been generated without --json
+        transcode = '_json.message({}.msg.{}, buffer, bufferOffset, options)'.format(package, msg_type)
+    if f.is_array:
+        s.write('json += \'{}[\';'.format(key))
+        s.write('for (let i = 0; i < len; ++i) {')
+        with Indent(s):
+            s.write('if (i > 0) {')
+            with Indent(s):
+                s.write('json += \',\';')
+            s.write('}')
+            s.write('json += {};'.format(transcode))
+        s.write('}')
+        s.write('json += \']\';')
+    else:
+        s.write('json += \'{}\' + {};'.format(key, transcode))
+
+def write_to_json_builtin(s, f, key):
+    if f.is_array:
+        if f.base_type == 'uint8':
+            # uint8[] deserializes to a Buffer rather than an Array
+            s.write('json += \'{}\' + _json.uint8Array(buffer, bufferOffset[0], len, options);'.format(key))
+            s.write('bufferOffset[0] += len;')
+        else:
+            s.write('json += \'{}[\';'.format(key))
+            s.write('for (let i = 0; i < len; ++i) {')
+            with Indent(s):
+                s.write('if (i > 0) {')
+                with Indent(s):
+                    s.write('json += \',\';')
+                s.write('}')
+                s.write('json += _json.{}(buffer, bufferOffset[0]);'.format(f.base_type))
+                write_to_json_advance(s, f.base_type)
+            s.write('}')
+            s.write('json += \']\';')
+    else:
+        s.write('json += \'{}\' + _json.{}(buffer, bufferOffset[0]);'.format(key, f.base_type))
+        write_to_json_advance(s, f.base_type)
+
+def write_to_json_field(s, f, package, first):
+    if f.is_array:
+        if not f.array_len:
+            write_to_json_length(s, f.name)
+        else:
+            s.write('len = {};'.format(f.array_len))
+
+    s.write('// Transcode message field [{}]'.format(f.name))
+    # the separating comma is folded into the key literal
+    key = '"{}":'.format(f.name) if first else ',"{}":'.format(f.name)
+    if f.is_builtin:
+        write_to_json_builtin(s, f, key)
+    else:
+        write_to_json_complex(s, f, key, package)
+
+def write_to_json(s, spec):
+    """
+    Write the toJSONString method, which transcodes the serialized form
+    directly into the JSON text of the deserialized message
+    """
+    with Indent(s):
+        s.write('static toJSONString(buffer, bufferOffset=[0], options={}) {')
+        with Indent(s):
+            s.write('// Transcodes a serialized message object of type {} to JSON'.format(spec.short_name))
+            s.write('if (typeof bufferOffset === \'number\') {')
+            with Indent(s):
+                s.write('bufferOffset = [bufferOffset];')
+            s.write('}')
+            s.write('let len;')
+            s.write('let json = \'{\';')
+            for (i, f) in enumerate(spec.parsed_fields()):
+                write_to_json_field(s, f, spec.package, i == 0)
+            s.write('return json + \'}\';')
+        s.write('}')
+        s.newline()
+
 def write_package_index(s, package_dir):
     s.write('"use strict";')
     s.newline()
@@ -524,11 +891,16 @@ def write_constants(s, spec):
         s.write('}')
         s.newline()
 
-def write_srv_component(s, spec, context, parent):
+def write_srv_component(s, spec, context, parent, emit_json=False, columnar=False):
     spec.component_type='service'
+    columnar_fields = get_columnar_fields(context, spec) if columnar else {}
     write_class(s, spec)
-    write_serialize(s, spec)
-    write_deserialize(s, spec)
+    write_serialize(s, spec, columnar_fields)
+    write_deserialize(s, spec, columnar_fields)
+    write_deserialize_fields(s, context, spec, columnar_fields)
+    write_skip(s, context, spec)
+    if emit_json:
+        write_to_json(s, spec)
     write_ros_datatype(s, spec)
     write_md5sum(s, context, spec)
     write_message_definition(s, context, spec)
@@ -544,7 +916,7 @@ def write_srv_end(s, name):
     s.write('};')
     s.newline()
 
-def generate_msg(pkg, files, out_dir, search_path):
+def generate_msg(pkg, files, out_dir, search_path, emit_json=False, columnar=False):
     """
     Generate javascript code for all messages in a package
     """
@@ -554,9 +926,10 @@ def generate_msg(pkg, files, out_dir, search_path):
         infile = os.path.basename(f)
         full_type = genmsg.gentools.compute_full_type_name(pkg, infile)
         spec = genmsg.msg_loader.load_msg_from_file(msg_context, f, full_type)
-        generate_msg_from_spec(msg_context, spec, search_path, out_dir, pkg)
+        generate_msg_from_spec(msg_context, spec, search_path, out_dir, pkg,
+                               emit_json=emit_json, columnar=columnar)
 
-def generate_srv(pkg, files, out_dir, search_path):
+def generate_srv(pkg, files, out_dir, search_path, emit_json=False, columnar=False):
     """
     Generate javascript code for all services in a package
     """
@@ -566,7 +939,8 @@ def generate_srv(pkg, files, out_dir, search_path):
         infile = os.path.basename(f)
         full_type = genmsg.gentools.compute_full_type_name(pkg, infile)
         spec = genmsg.msg_loader.load_srv_from_file(msg_context, f, full_type)
-        generate_srv_from_spec(msg_context, spec, search_path, out_dir, pkg, f)
+        generate_srv_from_spec(msg_context, spec, search_path, out_dir, pkg, f,
+                               emit_json=emit_json, columnar=columnar)
 
 def msg_list(pkg, search_path, ext):
     dir_list = search_path[pkg]
@@ -575,12 +949,17 @@ def msg_list(pkg, search_path, ext):
         files.extend([f for f in os.listdir(d) if f.endswith(ext)])
     return [f[:-len(ext)] for f in files]
 
-def generate_msg_from_spec(msg_context, spec, search_path, output_dir, package, msgs=None):
+def generate_msg_from_spec(msg_context, spec, search_path, output_dir, package, msgs=None,
+                           emit_json=False, columnar=False):
     """
     Generate a message
 
     @param msg_path: The path to the .msg file
     @type msg_path: str
+    @param emit_json: Also generate a toJSONString transcoder
+    @type emit_json: bool
+    @param columnar: Decode arrays of small fixed-size messages into TypedArray columns
+    @type columnar: bool
     """
     genmsg.msg_loader.load_depends(msg_context, spec, search_path)
     spec.actual_name=spec.short_name
@@ -596,10 +975,15 @@ def generate_msg_from_spec(msg_context, spec, search_path, output_dir, package,
     io = StringIO()
     s =  IndentedWriter(io)
     write_begin(s, spec)
-    write_requires(s, spec)
+    columnar_fields = get_columnar_fields(msg_context, spec) if columnar else {}
+    write_requires(s, spec, emit_json=emit_json)
     write_class(s, spec)
-    write_serialize(s, spec)
-    write_deserialize(s, spec)
+    write_serialize(s, spec, columnar_fields)
+    write_deserialize(s, spec, columnar_fields)
+    write_deserialize_fields(s, msg_context, spec, columnar_fields)
+    write_skip(s, msg_context, spec)
+    if emit_json:
+        write_to_json(s, spec)
     write_ros_datatype(s, spec)
     write_md5sum(s, msg_context, spec)
     write_message_definition(s, msg_context, spec)
@@ -643,7 +1027,8 @@ def generate_msg_from_spec(msg_context, spec, search_path, output_dir, package,
     io.close()
 
 # t0 most of this could probably be refactored into being shared with messages
-def generate_srv_from_spec(msg_context, spec, search_path, output_dir, package, path):
+def generate_srv_from_spec(msg_context, spec, search_path, output_dir, package, path,
+                           emit_json=False, columnar=False):
     "Generate code from .srv file"
     genmsg.msg_loader.load_depends(msg_context, spec, search_path)
     ext = '.srv'
@@ -659,12 +1044,12 @@ def generate_srv_from_spec(msg_context, spec, search_path, output_dir, package,
     io = StringIO()
     s = IndentedWriter(io)
     write_begin(s, spec, True)
-    found_packages,local_deps = write_requires(s, spec.request, None, None, True)
+    found_packages,local_deps = write_requires(s, spec.request, None, None, True, emit_json)
     write_requires(s, spec.response, found_packages, local_deps, True)
     spec.request.actual_name='%sRequest'%spec.short_name
     spec.response.actual_name='%sResponse'%spec.short_name
-    write_srv_component(s, spec.request, msg_context, spec)
-    write_srv_component(s, spec.response, msg_context, spec)
+    write_srv_component(s, spec.request, msg_context, spec, emit_json, columnar)
+    write_srv_component(s, spec.response, msg_context, spec, emit_json, columnar)
     write_srv_end(s, spec.short_name)
 
     with open('%s/%s.js'%(output_dir, spec.short_name), 'w') as f:
@@ -35,6 +35,10 @@ def genmain(argv, progname):
     parser.add_option('-p', dest='package')
     parser.add_option('-o', dest='outdir')
     parser.add_option('-I', dest='includepath', action='append')
+    parser.add_option('--json', dest='emit_json', action='store_true', default=False,
+                      help='also generate a toJSONString transcoder for each message')
+    parser.add_option('--columnar', dest='columnar', action='store_true', default=False,
+                      help='decode arrays of small fixed-size messages into TypedArray columns')
     options, args = parser.parse_args(argv)
     try:
         if len(args) < 2:
@@ -51,9 +55,11 @@ def genmain(argv, progname):
         search_path = genmsg.command_line.includepath_to_dict(options.includepath)
         filename = args[1]
         if filename.endswith('.msg'):
-            retcode = generate_msg(options.package, args[1:], options.outdir, search_path)
+            retcode = generate_msg(options.package, args[1:], options.outdir, search_path,
+                                   emit_json=options.emit_json, columnar=options.columnar)
         else:
-            retcode = generate_srv(options.package, args[1:], options.outdir, search_path)
+            retcode = generate_srv(options.package, args[1:], options.outdir, search_path,
+                                   emit_json=options.emit_json, columnar=options.columnar)
     except genmsg.InvalidMsgSpec as e:
         print("ERROR: ", e, file=sys.stderr)
         retcode = 1
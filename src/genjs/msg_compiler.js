@@ -0,0 +1,558 @@
+/*
+ *    Copyright 2016 Rethink Robotics
+ *
+ *    Copyright 2016 Chris Smith
+ *
+ *    Licensed under the Apache License, Version 2.0 (the "License");
+ *    you may not use this file except in compliance with the License.
+ *    You may obtain a copy of the License at
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *    Unless required by applicable law or agreed to in writing, software
+ *    distributed under the License is distributed on an "AS IS" BASIS,
+ *    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *    See the License for the specific language governing permissions and
+ *    limitations under the License.
+ */
+
+'use strict';
+
+//-----------------------------------------------------------------------------
+// Runtime message codec compiler
+//
+// Builds message classes from a full message definition (as returned by the
+// generated messageDefinition() methods, or stored in bag files) for types
+// that weren't generated at build time. The emitted code follows the same
+// strategy as generate.py so the wire format is identical.
+//-----------------------------------------------------------------------------
+
+let crypto = require('crypto');
+let _serializer = require('./base_serialize.js');
+let _deserializer = require('./base_deserialize.js');
+
+const BUILTIN_TYPES = ['int8', 'uint8', 'int16', 'uint16', 'int32', 'uint32',
+  'int64', 'uint64', 'float32', 'float64', 'string', 'bool', 'char', 'byte',
+  'time', 'duration'];
+
+const NUM_BYTES = {int8: 1, int16: 2, int32: 4, int64: 8,
+  uint8: 1, uint16: 2, uint32: 4, uint64: 8,
+  byte: 1, bool: 1, char: 1, float32: 4, float64: 8,
+  time: 8, duration: 8};
+
+let isBuiltin = function(type) {
+  return BUILTIN_TYPES.indexOf(type) >= 0;
+}
+
+//-----------------------------------------------------------------------------
+// Definition parsing
+//
+// Names and types end up in the generated source, and definitions come from
+// bag files and other nodes, so anything genmsg wouldn't accept is rejected
+// before any code is generated.
+//-----------------------------------------------------------------------------
+
+const NAME_PATTERN = /^[a-zA-Z][a-zA-Z0-9_]*$/;
+const TYPE_PATTERN = /^([a-zA-Z][a-zA-Z0-9_]*\/)?[a-zA-Z][a-zA-Z0-9_]*$/;
+
+let checkName = function(name, what) {
+  if (typeof name !== 'string' || !NAME_PATTERN.test(name)) {
+    throw new Error('Invalid ' + what + ' name in message definition: ' + JSON.stringify(name));
+  }
+}
+
+let checkType = function(type) {
+  if (typeof type !== 'string' || !TYPE_PATTERN.test(type)) {
+    throw new Error('Invalid type in message definition: ' + JSON.stringify(type));
+  }
+}
+
+let resolveType = function(type, pkg) {
+  if (isBuiltin(type) || type.indexOf('/') >= 0) {
+    return type;
+  }
+  else if (type === 'Header') {
+    return 'std_msgs/Header';
+  }
+  // else
+  return pkg + '/' + type;
+}
+
+let parseField = function(line, pkg) {
+  let parts = line.split(/\s+/);
+  if (parts.length !== 2) {
+    throw new Error('Invalid field in message definition: ' + JSON.stringify(line));
+  }
+  // else
+  let type = parts[0];
+  let match = /^(.*)\[(\d*)\]$/.exec(type);
+  let baseType = match ? match[1] : type;
+  checkType(baseType);
+  checkName(parts[1], 'field');
+  let resolved = resolveType(baseType, pkg);
+  return {
+    name: parts[1],
+    // keep the array suffix on the type, as genmsg does
+    type: match ? resolved + '[' + match[2] + ']' : resolved,
+    baseType: resolved,
+    isArray: !!match,
+    arrayLen: match && match[2] ? parseInt(match[2], 10) : null,
+    isBuiltin: isBuiltin(baseType)
+  };
+}
+
+let parseConstant = function(line) {
+  let type = line.split(/\s+/)[0];
+  let idx = line.indexOf('=');
+  let name = line.slice(line.indexOf(' ') + 1, idx).trim();
+  let valText;
+  if (type === 'string') {
+    // strings take everything to the right of the equals sign
+    valText = line.slice(idx + 1).trim();
+  }
+  else {
+    valText = line.split('#')[0].slice(idx + 1).trim();
+  }
+  if (!isBuiltin(type)) {
+    throw new Error('Invalid constant type in message definition: ' + JSON.stringify(type));
+  }
+  // else
+  checkName(name, 'constant');
+  return {
+    type: type,
+    name: name,
+    valText: valText
+  };
+}
+
+let parseMessage = function(text, fullName) {
+  let pkg = fullName.split('/')[0];
+  let fields = [];
+  let constants = [];
+  text.split('\n').forEach((line) => {
+    line = line.trim();
+    let clean = line.split('#')[0].trim();
+    if (!clean) {
+      return;
+    }
+    if (clean.indexOf('=') >= 0) {
+      constants.push(parseConstant(line));
+    }
+    else {
+      fields.push(parseField(clean, pkg));
+    }
+  });
+  return {
+    fullName: fullName,
+    shortName: fullName.split('/')[1],
+    text: text,
+    fields: fields,
+    constants: constants
+  };
+}
+
+let checkDatatype = function(datatype) {
+  checkType(datatype);
+  if (datatype.indexOf('/') < 0) {
+    throw new Error('Invalid datatype ' + JSON.stringify(datatype) + ', expected package/Type');
+  }
+}
+
+// Splits a full message definition into specs for the message and all of
+// the messages it depends on, keyed by full type name
+let parseDefinition = function(datatype, definition) {
+  checkDatatype(datatype);
+  // specs are added in the order they appear in the definition
+  let specs = {};
+  let name = datatype;
+  let lines = [];
+  definition.split('\n').forEach((line) => {
+    let trimmed = line.trim();
+    if (/^=+$/.test(trimmed)) {
+      specs[name] = parseMessage(lines.join('\n'), name);
+      name = null;
+      lines = [];
+    }
+    else if (name === null && trimmed.startsWith('MSG:')) {
+      let type = trimmed.slice(4).trim();
+      checkType(type);
+      name = resolveType(type, datatype.split('/')[0]);
+    }
+    else {
+      lines.push(line);
+    }
+  });
+  specs[name] = parseMessage(lines.join('\n'), name);
+  return specs;
+}
+
+//-----------------------------------------------------------------------------
+// md5sums, computed the same way as genmsg.compute_md5
+//-----------------------------------------------------------------------------
+
+let computeMd5 = function(specs, type, md5s) {
+  if (md5s.hasOwnProperty(type)) {
+    return md5s[type];
+  }
+  // else
+  let spec = specs[type];
+  if (spec === undefined) {
+    throw new Error('Message definition is missing dependency ' + type);
+  }
+  let lines = [];
+  spec.constants.forEach((c) => {
+    lines.push(c.type + ' ' + c.name + '=' + c.valText);
+  });
+  spec.fields.forEach((f) => {
+    if (f.isBuiltin) {
+      lines.push(f.type + ' ' + f.name);
+    }
+    else {
+      lines.push(computeMd5(specs, f.baseType, md5s) + ' ' + f.name);
+    }
+  });
+  md5s[type] = crypto.createHash('md5').update(lines.join('\n').trim()).digest('hex');
+  return md5s[type];
+}
+
+// Rebuilds the full definition of a type from its parsed section and
+// those of its dependencies, like genmsg.compute_full_text
+let computeFullText = function(specs, type) {
+  let depends = [];
+  let addDepends = function(t) {
+    specs[t].fields.forEach((f) => {
+      if (!f.isBuiltin && depends.indexOf(f.baseType) < 0) {
+        depends.push(f.baseType);
+        addDepends(f.baseType);
+      }
+    });
+  };
+  addDepends(type);
+  let text = specs[type].text;
+  Object.keys(specs).forEach((t) => {
+    if (depends.indexOf(t) >= 0) {
+      text += '\n' + '='.repeat(80) + '\nMSG: ' + t + '\n' + specs[t].text;
+    }
+  });
+  return text;
+}
+
+//-----------------------------------------------------------------------------
+// Code generation - mirrors the write_* functions in generate.py
+//-----------------------------------------------------------------------------
+
+let getFixedSize = function(specs, type) {
+  if (NUM_BYTES.hasOwnProperty(type)) {
+    return NUM_BYTES[type];
+  }
+  else if (type === 'string') {
+    return null;
+  }
+  // else
+  let size = 0;
+  for (let f of specs[type].fields) {
+    if (f.isArray && !f.arrayLen) {
+      return null;
+    }
+    let fieldSize = getFixedSize(specs, f.baseType);
+    if (fieldSize === null) {
+      return null;
+    }
+    size += fieldSize * (f.arrayLen || 1);
+  }
+  return size;
+}
+
+let getDefaultValue = function(f, deps) {
+  if (f.isArray) {
+    if (!f.arrayLen) {
+      return '[]';
+    }
+    // else
+    let elem = Object.assign({}, f, {isArray: false});
+    return 'new Array(' + f.arrayLen + ').fill(' + getDefaultValue(elem, deps) + ')';
+  }
+  else if (f.isBuiltin) {
+    if (f.baseType === 'string') {
+      return '\'\'';
+    }
+    else if (f.baseType === 'time' || f.baseType === 'duration') {
+      return '{secs: 0, nsecs: 0}';
+    }
+    else if (f.baseType === 'bool') {
+      return 'false';
+    }
+    else if (f.baseType === 'float32' || f.baseType === 'float64') {
+      return '0.0';
+    }
+    return '0';
+  }
+  // else
+  return 'new ' + deps(f.baseType) + '()';
+}
+
+let writeSerialize = function(lines, spec, deps) {
+  lines.push('static serialize(obj, bufferInfo) {');
+  spec.fields.forEach((f) => {
+    if (f.isArray && !f.arrayLen) {
+      lines.push('bufferInfo = _serializer.uint32(obj.' + f.name + '.length, bufferInfo);');
+    }
+    if (f.isBuiltin && f.isArray && f.baseType === 'uint8') {
+      lines.push('bufferInfo.buffer.push(obj.' + f.name + ');');
+      lines.push('bufferInfo.length += obj.' + f.name + '.length;');
+      return;
+    }
+    // else
+    let serializer = f.isBuiltin ? '_serializer.' + f.baseType : deps(f.baseType) + '.serialize';
+    if (f.isArray) {
+      lines.push('obj.' + f.name + '.forEach((val) => {');
+      lines.push('bufferInfo = ' + serializer + '(val, bufferInfo);');
+      lines.push('});');
+    }
+    else {
+      lines.push('bufferInfo = ' + serializer + '(obj.' + f.name + ', bufferInfo);');
+    }
+  });
+  lines.push('return bufferInfo;');
+  lines.push('}');
+}
+
+let writeDeserialize = function(lines, spec, deps) {
+  lines.push('static deserialize(buffer) {');
+  lines.push('let tmp;');
+  lines.push('let len;');
+  lines.push('let data = new ' + spec.shortName + '(null);');
+  spec.fields.forEach((f) => {
+    if (f.isArray) {
+      if (!f.arrayLen) {
+        lines.push('tmp = _deserializer.uint32(buffer);');
+        lines.push('len = tmp.data;');
+        lines.push('buffer = tmp.buffer;');
+      }
+      else {
+        lines.push('len = ' + f.arrayLen + ';');
+      }
+    }
+    if (f.isBuiltin && f.isArray && f.baseType === 'uint8') {
+      lines.push('data.' + f.name + ' = buffer.slice(0, len);');
+      lines.push('buffer = buffer.slice(len);');
+      return;
+    }
+    // else
+    let deserializer = f.isBuiltin ? '_deserializer.' + f.baseType : deps(f.baseType) + '.deserialize';
+    if (f.isArray) {
+      lines.push('data.' + f.name + ' = new Array(len);');
+      lines.push('for (let i = 0; i < len; ++i) {');
+      lines.push('tmp = ' + deserializer + '(buffer);');
+      lines.push('data.' + f.name + '[i] = tmp.data;');
+      lines.push('buffer = tmp.buffer;');
+      lines.push('}');
+    }
+    else {
+      lines.push('tmp = ' + deserializer + '(buffer);');
+      lines.push('data.' + f.name + ' = tmp.data;');
+      lines.push('buffer = tmp.buffer;');
+    }
+  });
+  lines.push('return {');
+  lines.push('data: data,');
+  lines.push('buffer: buffer');
+  lines.push('}');
+  lines.push('}');
+}
+
+let writeSkip = function(lines, spec, specs, deps) {
+  lines.push('static skip(buffer, offset=0) {');
+  let size = getFixedSize(specs, spec.fullName);
+  if (size !== null) {
+    lines.push('return offset + ' + size + ';');
+    lines.push('}');
+    return;
+  }
+  // else
+  lines.push('let len;');
+  spec.fields.forEach((f) => {
+    let fieldSize = getFixedSize(specs, f.baseType);
+    let step = f.isBuiltin ? 'offset += 4 + buffer.readUInt32LE(offset);'
+                           : 'offset = ' + deps(f.baseType) + '.skip(buffer, offset);';
+    if (!f.isArray) {
+      lines.push(fieldSize !== null ? 'offset += ' + fieldSize + ';' : step);
+    }
+    else if (fieldSize !== null) {
+      if (f.arrayLen) {
+        lines.push('offset += ' + fieldSize * f.arrayLen + ';');
+      }
+      else {
+        lines.push('offset += 4 + ' + fieldSize + ' * buffer.readUInt32LE(offset);');
+      }
+    }
+    else {
+      if (f.arrayLen) {
+        lines.push('len = ' + f.arrayLen + ';');
+      }
+      else {
+        lines.push('len = buffer.readUInt32LE(offset);');
+        lines.push('offset += 4;');
+      }
+      lines.push('for (let i = 0; i < len; ++i) {');
+      lines.push(step);
+      lines.push('}');
+    }
+  });
+  lines.push('return offset;');
+  lines.push('}');
+}
+
+let writeClass = function(spec, specs, deps) {
+  let lines = [];
+  lines.push('return class ' + spec.shortName + ' {');
+  lines.push('constructor(initObj={}) {');
+  lines.push('if (initObj === null) {');
+  spec.fields.forEach((f) => {
+    lines.push('this.' + f.name + ' = null;');
+  });
+  lines.push('} else {');
+  spec.fields.forEach((f) => {
+    lines.push('if (initObj.hasOwnProperty(\'' + f.name + '\')) {');
+    lines.push('this.' + f.name + ' = initObj.' + f.name + ';');
+    lines.push('} else {');
+    lines.push('this.' + f.name + ' = ' + getDefaultValue(f, deps) + ';');
+    lines.push('}');
+  });
+  lines.push('}');
+  lines.push('}');
+  writeSerialize(lines, spec, deps);
+  writeDeserialize(lines, spec, deps);
+  writeSkip(lines, spec, specs, deps);
+  lines.push('};');
+  return lines.join('\n');
+}
+
+let writeConstants = function(Msg, spec) {
+  if (spec.constants.length === 0) {
+    return;
+  }
+  // else
+  Msg.Constants = {};
+  spec.constants.forEach((c) => {
+    let val = c.valText;
+    if (c.type === 'bool') {
+      val = val === 'True' || val === 'true' || val === '1';
+    }
+    else if (c.type !== 'string') {
+      val = Number(val);
+    }
+    Msg.Constants[c.name.toUpperCase()] = val;
+  });
+}
+
+//-----------------------------------------------------------------------------
+// Compilation and caching
+//-----------------------------------------------------------------------------
+
+// LRU cache of compiled message classes, keyed by datatype and md5sum since
+// identical definitions under different names share an md5sum
+let cache = new Map();
+let cacheSize = 256;
+
+let getCached = function(key) {
+  let Msg = cache.get(key);
+  if (Msg !== undefined) {
+    // move to the most recently used end
+    cache.delete(key);
+    cache.set(key, Msg);
+  }
+  return Msg;
+}
+
+let setCached = function(key, Msg) {
+  cache.set(key, Msg);
+  while (cache.size > cacheSize) {
+    cache.delete(cache.keys().next().value);
+  }
+}
+
+let compileType = function(type, specs, md5s, definition) {
+  let md5sum = computeMd5(specs, type, md5s);
+  let Msg = getCached(type + ':' + md5sum);
+  if (Msg !== undefined) {
+    return Msg;
+  }
+  // else
+  let spec = specs[type];
+  let depTypes = [];
+  let depClasses = [];
+  let deps = function(depType) {
+    let idx = depTypes.indexOf(depType);
+    if (idx < 0) {
+      depTypes.push(depType);
+      depClasses.push(compileType(depType, specs, md5s));
+      idx = depTypes.length - 1;
+    }
+    return '_deps[' + idx + ']';
+  }
+  let source = writeClass(spec, specs, deps);
+  Msg = new Function('_serializer', '_deserializer', '_deps', source)(
+    _serializer, _deserializer, depClasses);
+  if (definition === undefined) {
+    definition = computeFullText(specs, type);
+  }
+  Msg.datatype = function() {
+    return type;
+  };
+  Msg.md5sum = function() {
+    return md5sum;
+  };
+  Msg.messageDefinition = function() {
+    return definition;
+  };
+  writeConstants(Msg, spec);
+  setCached(type + ':' + md5sum, Msg);
+  return Msg;
+}
+
+// Returns a message class for datatype, compiled from its full message
+// definition. If md5sum is given it is used to look up the cache before
+// parsing and is checked against the md5sum of the parsed definition.
+let compile = function(datatype, definition, md5sum) {
+  if (md5sum !== undefined && md5sum !== '*') {
+    let Msg = getCached(datatype + ':' + md5sum);
+    if (Msg !== undefined) {
+      return Msg;
+    }
+  }
+  // else
+  let specs = parseDefinition(datatype, definition);
+  let Msg = compileType(datatype, specs, {}, definition);
+  if (md5sum !== undefined && md5sum !== '*' && Msg.md5sum() !== md5sum) {
+    throw new Error('md5sum mismatch for ' + datatype + ': expected ' + md5sum +
+                    ', definition gives ' + Msg.md5sum());
+  }
+  return Msg;
+}
+
+// Returns the class a compiled message uses for one of the types nested in
+// it, e.g. dependency(PoseStamped, 'std_msgs/Header')
+let dependency = function(Msg, type) {
+  let specs = parseDefinition(Msg.datatype(), Msg.messageDefinition());
+  if (!specs.hasOwnProperty(type)) {
+    throw new Error(Msg.datatype() + ' does not depend on ' + type);
+  }
+  // else
+  return compileType(type, specs, {});
+}
+
+let setCacheSize = function(size) {
+  cacheSize = size;
+  while (cache.size > cacheSize) {
+    cache.delete(cache.keys().next().value);
+  }
+}
+
+//-----------------------------------------------------------------------------
+
+module.exports = {
+  compile: compile,
+  dependency: dependency,
+  parseDefinition: parseDefinition,
+  setCacheSize: setCacheSize
+};
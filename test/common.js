@@ -0,0 +1,197 @@
+/*
+ *    Copyright 2016 Rethink Robotics
+ *
+ *    Copyright 2016 Chris Smith
+ *
+ *    Licensed under the Apache License, Version 2.0 (the "License");
+ *    you may not use this file except in compliance with the License.
+ *    You may obtain a copy of the License at
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *    Unless required by applicable law or agreed to in writing, software
+ *    distributed under the License is distributed on an "AS IS" BASIS,
+ *    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *    See the License for the specific language governing permissions and
+ *    limitations under the License.
+ */
+
+'use strict';
+
+//-----------------------------------------------------------------------------
+// Shared test helpers
+//
+// generate() runs generate_fixtures.py with $PYTHON (default python), which
+// needs genmsg on its path, and points find.js at the result. Each test file
+// runs in its own process, so it can only generate once.
+//-----------------------------------------------------------------------------
+
+let child_process = require('child_process');
+let fs = require('fs');
+let os = require('os');
+let path = require('path');
+
+// Generates the test messages with the given generator flags and returns
+// {finder, fixtures, prefix}
+let generate = function(flags=[]) {
+  let prefix = fs.mkdtempSync(path.join(os.tmpdir(), 'genjs-test-'));
+  child_process.execFileSync(process.env.PYTHON || 'python',
+                             [path.join(__dirname, 'generate_fixtures.py'), prefix].concat(flags),
+                             {stdio: 'inherit'});
+  // find.js reads this when it is loaded
+  process.env.CMAKE_PREFIX_PATH = prefix;
+  return {
+    finder: require(path.join(prefix, 'share/node_js/find.js')),
+    fixtures: JSON.parse(fs.readFileSync(path.join(prefix, 'fixtures.json'), 'utf8')),
+    prefix: prefix
+  };
+}
+
+//-----------------------------------------------------------------------------
+// Sample messages
+//-----------------------------------------------------------------------------
+
+let int64 = function(lo, hi) {
+  let buf = Buffer.alloc(8);
+  buf.writeUInt32LE(lo, 0);
+  buf.writeUInt32LE(hi, 4);
+  return buf;
+}
+
+let header = function(seq) {
+  return {seq: seq, stamp: {secs: 1500000000 + seq, nsecs: 250}, frame_id: 'map ' + seq};
+}
+
+let point = function(x) {
+  return {x: x, y: -x, z: 0.25};
+}
+
+let pose = function(x) {
+  return {
+    position: point(x),
+    orientation: {x: 0, y: 0, z: 0.5, w: 1}
+  };
+}
+
+let builtins = function(n) {
+  return {
+    flag: true,
+    b: -5,
+    c: 200,
+    i8: -128,
+    u8: 255,
+    i16: -32768,
+    u16: 65535,
+    i32: -2147483648,
+    u32: 4294967295,
+    i64: int64(0xffffffff, 0x7fffffff),
+    u64: int64(n, 0xffffffff),
+    f32: 1.5,
+    f64: -1e300,
+    text: 'héllo "世界"\n',
+    stamp: {secs: 10, nsecs: 999999999},
+    timeout: {secs: -3, nsecs: 5},
+    data: Buffer.from([0, 1, 254, 255].slice(0, n)),
+    longs: [int64(1, 0), int64(0, 1)].slice(0, n),
+    stamps: [{secs: 1, nsecs: 2}],
+    words: ['', 'a', 'bc'].slice(0, n)
+  };
+}
+
+let samples = {
+  'std_msgs/Header': header(7),
+  'geometry_msgs/Point': {x: 1, y: 2.5, z: -3},
+  'geometry_msgs/Point32': {x: 0.5, y: -1.25, z: 3},
+  'geometry_msgs/Quaternion': {x: 0, y: 0, z: 0, w: 1},
+  'geometry_msgs/Pose': pose(2),
+  'geometry_msgs/PoseStamped': {header: header(3), pose: pose(4)},
+  'genjs_test_msgs/Constants': {state: 1, label: 'busy'},
+  'genjs_test_msgs/FixedArrays': {
+    names: ['left', '', 'right'],
+    points: [point(1), point(-1)],
+    bytes: Buffer.from([1, 2, 3, 4]),
+    gains: [0.5, -0.25]
+  },
+  'genjs_test_msgs/Builtins': builtins(3),
+  'genjs_test_msgs/NestedArrays': {
+    header: header(1),
+    poses: [{header: header(2), pose: pose(1)}, {header: header(3), pose: pose(-1)}],
+    builtins: [builtins(0), builtins(2)]
+  },
+  'genjs_test_msgs/Columns': {
+    header: header(5),
+    cloud: [{x: 1, y: 2, z: 3}, {x: 0.5, y: -0.5, z: 0}, {x: -8, y: 16, z: 0.125}],
+    poses: [pose(1), pose(2)],
+    corners: [point(3), point(4)]
+  }
+};
+
+//-----------------------------------------------------------------------------
+// Helpers
+//-----------------------------------------------------------------------------
+
+let serialize = function(Msg, obj) {
+  let bufferInfo = Msg.serialize(obj, {buffer: [], length: 0});
+  return Buffer.concat(bufferInfo.buffer, bufferInfo.length);
+}
+
+// Strips message class prototypes so results compare by value
+let plain = function(val) {
+  if (Buffer.isBuffer(val) || ArrayBuffer.isView(val)) {
+    return val;
+  }
+  else if (Array.isArray(val)) {
+    return val.map(plain);
+  }
+  else if (typeof val === 'object' && val !== null) {
+    let obj = {};
+    Object.keys(val).forEach((key) => {
+      obj[key] = plain(val[key]);
+    });
+    return obj;
+  }
+  // else
+  return val;
+}
+
+let tests = [];
+
+// Registers a test - fn may return a promise
+let test = function(name, fn) {
+  tests.push({name: name, fn: fn});
+}
+
+// Runs the registered tests in order and exits non-zero if any failed
+let run = function() {
+  let failures = 0;
+  let next = function(i) {
+    if (i === tests.length) {
+      if (failures > 0) {
+        console.log(failures + ' failed');
+      }
+      process.exit(failures > 0 ? 1 : 0);
+    }
+    // else
+    return Promise.resolve().then(tests[i].fn).then(() => {
+      console.log('ok - ' + tests[i].name);
+    }, (err) => {
+      ++failures;
+      console.log('not ok - ' + tests[i].name);
+      console.log(String(err.stack).replace(/^/gm, '  # '));
+    }).then(() => next(i + 1));
+  };
+  return next(0);
+}
+
+module.exports = {
+  generate: generate,
+  int64: int64,
+  header: header,
+  point: point,
+  pose: pose,
+  builtins: builtins,
+  samples: samples,
+  serialize: serialize,
+  plain: plain,
+  test: test,
+  run: run
+};
@@ -0,0 +1,89 @@
+#
+#    Copyright 2016 Rethink Robotics
+#
+#    Copyright 2016 Chris Smith
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+## Generates the test message packages under test/msg into a fake install
+## prefix and records genmsg's md5sum and full text for each message type,
+## which the tests check the generated and compiled code against. Generator
+## flags such as --json only apply to genjs_test_msgs, the same way
+## GENJS_FLAGS only applies to the package that sets it.
+##
+##   python generate_fixtures.py <output prefix> [--json] [--columnar]
+
+from __future__ import print_function
+
+import glob
+import json
+import os
+from optparse import OptionParser
+import shutil
+import sys
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TEST_DIR), 'src'))
+
+import genmsg
+import genmsg.msg_loader
+from genmsg import MsgContext
+
+from genjs.generate import generate_msg
+
+MSG_DIR = os.path.join(TEST_DIR, 'msg')
+# packages in dependency order - the generator looks up the output of the
+# packages a message depends on
+PACKAGES = ['std_msgs', 'geometry_msgs', 'genjs_test_msgs']
+FLAGS_PACKAGE = 'genjs_test_msgs'
+
+def main(argv):
+    parser = OptionParser('%prog <output prefix> [--json] [--columnar]')
+    parser.add_option('--json', dest='emit_json', action='store_true', default=False)
+    parser.add_option('--columnar', dest='columnar', action='store_true', default=False)
+    options, args = parser.parse_args(argv[1:])
+    if len(args) != 1:
+        parser.error('please specify an output prefix')
+    # else
+    prefix = os.path.abspath(args[0])
+    node_js_dir = os.path.join(prefix, 'share', 'node_js')
+    if not os.path.exists(node_js_dir):
+        os.makedirs(node_js_dir)
+    for f in glob.glob(os.path.join(TEST_DIR, '..', 'src', 'genjs', '*.js')):
+        shutil.copy(f, node_js_dir)
+    os.environ['CMAKE_PREFIX_PATH'] = prefix
+
+    search_path = dict((pkg, [os.path.join(MSG_DIR, pkg, 'msg')]) for pkg in PACKAGES)
+    fixtures = {}
+    for pkg in PACKAGES:
+        files = sorted(glob.glob(os.path.join(MSG_DIR, pkg, 'msg', '*.msg')))
+        kwargs = {}
+        if pkg == FLAGS_PACKAGE:
+            kwargs = {'emit_json': options.emit_json, 'columnar': options.columnar}
+        generate_msg(pkg, files, os.path.join(node_js_dir, 'ros', pkg, 'msg'), search_path,
+                     **kwargs)
+        for f in files:
+            full_type = '%s/%s'%(pkg, os.path.splitext(os.path.basename(f))[0])
+            msg_context = MsgContext.create_default()
+            spec = genmsg.msg_loader.load_msg_by_type(msg_context, full_type, search_path)
+            genmsg.msg_loader.load_depends(msg_context, spec, search_path)
+            fixtures[full_type] = {
+                'md5sum': genmsg.compute_md5(msg_context, spec),
+                'definition': genmsg.compute_full_text(msg_context, spec)
+            }
+
+    with open(os.path.join(prefix, 'fixtures.json'), 'w') as f:
+        json.dump(fixtures, f, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,42 @@
+/*
+ *    Copyright 2016 Rethink Robotics
+ *
+ *    Copyright 2016 Chris Smith
+ *
+ *    Licensed under the Apache License, Version 2.0 (the "License");
+ *    you may not use this file except in compliance with the License.
+ *    You may obtain a copy of the License at
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *    Unless required by applicable law or agreed to in writing, software
+ *    distributed under the License is distributed on an "AS IS" BASIS,
+ *    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *    See the License for the specific language governing permissions and
+ *    limitations under the License.
+ */
+
+'use strict';
+
+//-----------------------------------------------------------------------------
+// Runs every test/test_*.js file in its own process
+//
+//   PYTHON=python2 node test/run.js
+//-----------------------------------------------------------------------------
+
+let child_process = require('child_process');
+let fs = require('fs');
+let path = require('path');
+
+let failed = fs.readdirSync(__dirname).filter((name) => {
+  return name.startsWith('test_') && name.endsWith('.js');
+}).sort().filter((name) => {
+  console.log('# ' + name);
+  let result = child_process.spawnSync(process.execPath, [path.join(__dirname, name)],
+                                       {stdio: 'inherit'});
+  return result.status !== 0;
+});
+
+if (failed.length > 0) {
+  console.log('failed: ' + failed.join(', '));
+  process.exit(1);
+}
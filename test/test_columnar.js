@@ -0,0 +1,135 @@
+/*
+ *    Copyright 2016 Rethink Robotics
+ *
+ *    Copyright 2016 Chris Smith
+ *
+ *    Licensed under the Apache License, Version 2.0 (the "License");
+ *    you may not use this file except in compliance with the License.
+ *    You may obtain a copy of the License at
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *    Unless required by applicable law or agreed to in writing, software
+ *    distributed under the License is distributed on an "AS IS" BASIS,
+ *    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *    See the License for the specific language governing permissions and
+ *    limitations under the License.
+ */
+
+'use strict';
+
+//-----------------------------------------------------------------------------
+// Checks columnar decoding of arrays of small fixed-size messages, with
+// genjs_test_msgs generated with --columnar. The runtime compiler never
+// decodes into columns, so it serves as the row-wise reference.
+//
+//   node test/test_columnar.js
+//-----------------------------------------------------------------------------
+
+let assert = require('assert');
+let common = require('./common.js');
+let compiler = require('../src/genjs/msg_compiler.js');
+
+let {finder, fixtures} = common.generate(['--columnar']);
+let {samples, serialize, plain, test} = common;
+let Columns = finder('genjs_test_msgs').msg.Columns;
+let RowColumns = compiler.compile('genjs_test_msgs/Columns',
+                                  fixtures['genjs_test_msgs/Columns'].definition);
+
+let sample = samples['genjs_test_msgs/Columns'];
+let buffer = serialize(Columns, sample);
+
+// Transposes columns, e.g. {x: [1, 2], y: [3, 4]} into [{x: 1, y: 3}, {x: 2, y: 4}]
+let rows = function(columns) {
+  let transpose = function(node, i) {
+    if (ArrayBuffer.isView(node)) {
+      return node[i];
+    }
+    // else
+    let row = {};
+    Object.keys(node).forEach((key) => {
+      row[key] = transpose(node[key], i);
+    });
+    return row;
+  };
+  let len = columns;
+  while (!ArrayBuffer.isView(len)) {
+    len = len[Object.keys(len)[0]];
+  }
+  let result = [];
+  for (let i = 0; i < len.length; ++i) {
+    result.push(transpose(columns, i));
+  }
+  return result;
+}
+
+test('array of messages serializes as before', () => {
+  assert.ok(buffer.equals(serialize(RowColumns, sample)));
+});
+
+test('deserialize into columns', () => {
+  let data = Columns.deserialize(buffer).data;
+  assert.ok(data.cloud.x instanceof Float32Array);
+  assert.ok(data.poses.position.x instanceof Float64Array);
+  assert.ok(data.poses.orientation.w instanceof Float64Array);
+  assert.ok(data.corners.x instanceof Float64Array);
+  assert.deepStrictEqual(Array.from(data.cloud.z), [3, 0, 0.125]);
+  assert.strictEqual(data.corners.x.length, 2);
+  let expected = plain(RowColumns.deserialize(buffer).data);
+  assert.deepStrictEqual(plain(data.header), expected.header);
+  assert.deepStrictEqual(rows(data.cloud), expected.cloud);
+  assert.deepStrictEqual(rows(data.poses), expected.poses);
+  assert.deepStrictEqual(rows(data.corners), expected.corners);
+});
+
+test('round trip through columns', () => {
+  let data = Columns.deserialize(buffer).data;
+  assert.ok(serialize(Columns, data).equals(buffer));
+});
+
+test('empty columns', () => {
+  let empty = Object.assign({}, sample, {cloud: [], poses: []});
+  let emptyBuffer = serialize(Columns, empty);
+  let data = Columns.deserialize(emptyBuffer).data;
+  assert.strictEqual(data.cloud.x.length, 0);
+  assert.strictEqual(data.poses.orientation.w.length, 0);
+  assert.ok(serialize(Columns, data).equals(emptyBuffer));
+});
+
+test('skip', () => {
+  assert.strictEqual(Columns.skip(Buffer.concat([buffer, buffer]), buffer.length), 2 * buffer.length);
+});
+
+test('deserializeFields on a columnar field', () => {
+  let data = Columns.deserialize(buffer).data;
+  [['cloud'], ['cloud.x'], {cloud: true}].forEach((fields) => {
+    let result = Columns.deserializeFields(buffer, fields);
+    assert.strictEqual(result.buffer.length, 0);
+    assert.strictEqual(result.data.header, null);
+    assert.strictEqual(result.data.poses, null);
+    assert.strictEqual(result.data.corners, null);
+    // columns are always decoded in full
+    assert.deepStrictEqual(result.data.cloud, data.cloud);
+  });
+  let result = Columns.deserializeFields(buffer, ['header', 'corners']);
+  assert.strictEqual(result.buffer.length, 0);
+  assert.strictEqual(result.data.cloud, null);
+  assert.deepStrictEqual(result.data.corners, data.corners);
+});
+
+test('columns of different lengths', () => {
+  let data = Columns.deserialize(buffer).data;
+  data.cloud.y = data.cloud.y.subarray(1);
+  assert.throws(() => serialize(Columns, data), /Columns of message field \[cloud\] have different lengths/);
+});
+
+test('fixed-length field with the wrong number of elements', () => {
+  let data = Columns.deserialize(buffer).data;
+  data.corners = {
+    x: new Float64Array(3),
+    y: new Float64Array(3),
+    z: new Float64Array(3)
+  };
+  assert.throws(() => serialize(Columns, data), /Message field \[corners\] needs 2 elements/);
+});
+
+common.run();
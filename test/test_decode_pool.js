@@ -0,0 +1,197 @@
+/*
+ *    Copyright 2016 Rethink Robotics
+ *
+ *    Copyright 2016 Chris Smith
+ *
+ *    Licensed under the Apache License, Version 2.0 (the "License");
+ *    you may not use this file except in compliance with the License.
+ *    You may obtain a copy of the License at
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *    Unless required by applicable law or agreed to in writing, software
+ *    distributed under the License is distributed on an "AS IS" BASIS,
+ *    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *    See the License for the specific language governing permissions and
+ *    limitations under the License.
+ */
+
+'use strict';
+
+//-----------------------------------------------------------------------------
+// Checks the worker thread decode pool
+//
+//   node test/test_decode_pool.js
+//-----------------------------------------------------------------------------
+
+let assert = require('assert');
+let path = require('path');
+let common = require('./common.js');
+
+let {finder, fixtures, prefix} = common.generate();
+let {samples, serialize, plain, test} = common;
+// use the installed copies, like generated code does
+let DecodePool = require(path.join(prefix, 'share/node_js/decode_pool.js'));
+let compiler = require(path.join(prefix, 'share/node_js/msg_compiler.js'));
+
+let std_msgs = finder('std_msgs').msg;
+let geometry_msgs = finder('geometry_msgs').msg;
+let test_msgs = finder('genjs_test_msgs').msg;
+
+const THRESHOLD = 512;
+
+let large = function(n) {
+  let sample = Object.assign({}, samples['genjs_test_msgs/Builtins']);
+  sample.data = Buffer.alloc(THRESHOLD + n, n);
+  return serialize(test_msgs.Builtins, sample);
+}
+let small = serialize(test_msgs.Builtins, samples['genjs_test_msgs/Builtins']);
+
+let nested = function() {
+  let sample = Object.assign({}, samples['genjs_test_msgs/NestedArrays']);
+  let builtins = Object.assign({}, samples['genjs_test_msgs/Builtins'], {data: Buffer.alloc(THRESHOLD)});
+  sample.builtins = sample.builtins.concat([builtins]);
+  return serialize(test_msgs.NestedArrays, sample);
+}
+
+test('results keep submission order and class', () => {
+  let pool = new DecodePool({threshold: THRESHOLD, workers: 2});
+  let buffers = [];
+  for (let i = 0; i < 12; ++i) {
+    buffers.push(i % 2 ? small : large(i));
+  }
+  let order = [];
+  let promises = buffers.map((buffer, i) => {
+    return pool.decode('/builtins', test_msgs.Builtins, buffer).then((data) => {
+      order.push(i);
+      return data;
+    });
+  });
+  assert.strictEqual(pool.queueDepth('/builtins'), 12);
+  return Promise.all(promises).then((results) => {
+    assert.deepStrictEqual(order, buffers.map((buffer, i) => i));
+    results.forEach((data, i) => {
+      assert.ok(data instanceof test_msgs.Builtins, 'result ' + i);
+      assert.deepStrictEqual(plain(data), plain(test_msgs.Builtins.deserialize(buffers[i]).data));
+    });
+    assert.strictEqual(pool.queueDepth(), 0);
+    let stats = pool.stats();
+    assert.strictEqual(stats.decodedInWorkers, 6);
+    assert.strictEqual(stats.decodedInline, 6);
+    return pool.close();
+  });
+});
+
+test('below the threshold decodes inline', () => {
+  let pool = new DecodePool({threshold: THRESHOLD, workers: 1});
+  let promise = pool.decode('/small', test_msgs.Builtins, small);
+  // nothing is queued for a message decoded straight away
+  assert.strictEqual(pool.queueDepth(), 0);
+  return promise.then((data) => {
+    assert.ok(data instanceof test_msgs.Builtins);
+    assert.strictEqual(pool.stats().decodedInline, 1);
+    assert.strictEqual(pool.stats().decodedInWorkers, 0);
+    return pool.close();
+  });
+});
+
+test('nested classes of generated messages', () => {
+  let pool = new DecodePool({threshold: THRESHOLD, workers: 1});
+  let buffer = nested();
+  return pool.decode('/nested', test_msgs.NestedArrays, buffer).then((data) => {
+    assert.ok(data instanceof test_msgs.NestedArrays);
+    assert.ok(data.header instanceof std_msgs.Header);
+    assert.ok(data.poses[0] instanceof geometry_msgs.PoseStamped);
+    assert.ok(data.poses[0].pose.position instanceof geometry_msgs.Point);
+    assert.ok(data.builtins[2] instanceof test_msgs.Builtins);
+    // payload buffers are views of the shared message memory
+    assert.ok(data.builtins[2].data.buffer instanceof SharedArrayBuffer);
+    assert.deepStrictEqual(plain(data), plain(test_msgs.NestedArrays.deserialize(buffer).data));
+    return pool.close();
+  });
+});
+
+test('nested classes of compiled messages', () => {
+  let pool = new DecodePool({threshold: THRESHOLD, workers: 1});
+  let fixture = fixtures['genjs_test_msgs/NestedArrays'];
+  let Compiled = compiler.compile('genjs_test_msgs/NestedArrays', fixture.definition);
+  let buffer = nested();
+  return pool.decode('/nested', Compiled, buffer).then((data) => {
+    assert.ok(data instanceof Compiled);
+    assert.ok(data.poses[1] instanceof compiler.dependency(Compiled, 'geometry_msgs/PoseStamped'));
+    assert.ok(data.poses[1].header instanceof compiler.dependency(Compiled, 'std_msgs/Header'));
+    assert.deepStrictEqual(plain(data), plain(Compiled.deserialize(buffer).data));
+    return pool.close();
+  });
+});
+
+test('decode errors', () => {
+  let pool = new DecodePool({threshold: THRESHOLD, workers: 1});
+  let truncated = large(1).slice(0, THRESHOLD + 40);
+  return assert.rejects(pool.decode('/bad', test_msgs.Builtins, truncated)).then(() => {
+    assert.strictEqual(pool.stats().decodedInWorkers, 0);
+    return assert.rejects(pool.decode('/bad', test_msgs.Builtins, small.slice(0, 10)));
+  }).then(() => {
+    assert.strictEqual(pool.stats().decodedInline, 0);
+    return pool.decode('/bad', test_msgs.Builtins, large(2));
+  }).then((data) => {
+    assert.ok(data instanceof test_msgs.Builtins);
+    return pool.close();
+  });
+});
+
+test('definitions that fail to compile', () => {
+  let pool = new DecodePool({threshold: THRESHOLD, workers: 1});
+  let worker = pool.workers[0];
+  let Bad = {
+    datatype: () => 'genjs_test_msgs/Missing',
+    md5sum: () => '0123456789abcdef0123456789abcdef',
+    messageDefinition: () => 'genjs_test_msgs/Gone gone'
+  };
+  let buffer = Buffer.alloc(THRESHOLD);
+  return Promise.all([
+    assert.rejects(pool.decode('/missing', Bad, buffer), /missing dependency/),
+    assert.rejects(pool.decode('/missing', Bad, buffer), /missing dependency/)
+  ]).then(() => {
+    // the worker survives and keeps decoding
+    assert.strictEqual(pool.workers[0], worker);
+    return pool.decode('/builtins', test_msgs.Builtins, large(3));
+  }).then((data) => {
+    assert.ok(data instanceof test_msgs.Builtins);
+    return pool.close();
+  });
+});
+
+test('worker exit', () => {
+  let pool = new DecodePool({threshold: THRESHOLD, workers: 1});
+  let worker = pool.workers[0];
+  let terminated = worker.worker.terminate();
+  let promise = pool.decode('/builtins', test_msgs.Builtins, large(4));
+  return terminated.then(() => assert.rejects(promise, /exited/)).then(() => {
+    assert.notStrictEqual(pool.workers[0], worker);
+    assert.strictEqual(pool.queueDepth(), 0);
+    return pool.decode('/builtins', test_msgs.Builtins, large(5));
+  }).then((data) => {
+    assert.ok(data instanceof test_msgs.Builtins);
+    return pool.close();
+  });
+});
+
+test('close', () => {
+  let pool = new DecodePool({threshold: THRESHOLD, workers: 1});
+  let queued = [
+    pool.decode('/builtins', test_msgs.Builtins, large(6)),
+    pool.decode('/builtins', test_msgs.Builtins, small)
+  ];
+  let closed = pool.close();
+  return Promise.all([
+    assert.rejects(queued[0], /closed/),
+    // already decoded inline, and delivered once the message ahead fails
+    queued[1].then((data) => assert.ok(data instanceof test_msgs.Builtins)),
+    assert.rejects(pool.decode('/builtins', test_msgs.Builtins, small), /closed/),
+    closed
+  ]).then(() => {
+    assert.strictEqual(pool.queueDepth(), 0);
+  });
+});
+
+common.run();
@@ -0,0 +1,117 @@
+/*
+ *    Copyright 2016 Rethink Robotics
+ *
+ *    Copyright 2016 Chris Smith
+ *
+ *    Licensed under the Apache License, Version 2.0 (the "License");
+ *    you may not use this file except in compliance with the License.
+ *    You may obtain a copy of the License at
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *    Unless required by applicable law or agreed to in writing, software
+ *    distributed under the License is distributed on an "AS IS" BASIS,
+ *    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *    See the License for the specific language governing permissions and
+ *    limitations under the License.
+ */
+
+'use strict';
+
+//-----------------------------------------------------------------------------
+// Checks the generated deserializeFields() methods and field masks
+//
+//   node test/test_deserialize_fields.js
+//-----------------------------------------------------------------------------
+
+let assert = require('assert');
+let common = require('./common.js');
+
+let {finder} = common.generate();
+let {samples, serialize, plain, test} = common;
+let NestedArrays = finder('genjs_test_msgs').msg.NestedArrays;
+
+let sample = samples['genjs_test_msgs/NestedArrays'];
+let buffer = serialize(NestedArrays, sample);
+let full = plain(NestedArrays.deserialize(buffer).data);
+// trailing bytes that must be left in the returned buffer
+let trailer = Buffer.from([1, 2, 3]);
+
+let select = function(fields) {
+  let result = NestedArrays.deserializeFields(Buffer.concat([buffer, trailer]), fields);
+  assert.ok(result.buffer.equals(trailer));
+  return plain(result.data);
+}
+
+test('no mask', () => {
+  assert.deepStrictEqual(select(), full);
+  assert.deepStrictEqual(select(null), full);
+});
+
+test('all fields', () => {
+  assert.deepStrictEqual(select(['header', 'poses', 'builtins']), full);
+  assert.deepStrictEqual(select({header: true, poses: true, builtins: true}), full);
+});
+
+test('top level field', () => {
+  assert.deepStrictEqual(select(['header']), {header: full.header, poses: null, builtins: null});
+});
+
+test('nested path', () => {
+  assert.deepStrictEqual(select(['poses.pose.position']), {
+    header: null,
+    poses: full.poses.map((p) => {
+      return {header: null, pose: {position: p.pose.position, orientation: null}};
+    }),
+    builtins: null
+  });
+});
+
+test('parent and child paths', () => {
+  let expected = {header: null, poses: full.poses, builtins: null};
+  assert.deepStrictEqual(select(['poses', 'poses.pose.position']), expected);
+  assert.deepStrictEqual(select(['poses.pose.position', 'poses']), expected);
+  assert.deepStrictEqual(select(['poses.pose', 'poses.pose.position']), select(['poses.pose']));
+});
+
+test('builtin sub-path', () => {
+  assert.deepStrictEqual(select(['header.stamp.secs']), {
+    header: {seq: null, stamp: full.header.stamp, frame_id: null},
+    poses: null,
+    builtins: null
+  });
+  assert.deepStrictEqual(select(['builtins.stamp.nsecs']).builtins,
+                         full.builtins.map((b) => {
+                           let expected = {};
+                           Object.keys(b).forEach((key) => {
+                             expected[key] = key === 'stamp' ? b.stamp : null;
+                           });
+                           return expected;
+                         }));
+});
+
+test('mask array modified after use', () => {
+  let fields = ['header'];
+  assert.strictEqual(select(fields).builtins, null);
+  fields.push('builtins');
+  assert.deepStrictEqual(select(fields).builtins, full.builtins);
+});
+
+test('single field of each sample', () => {
+  Object.keys(samples).forEach((type) => {
+    let [pkg, name] = type.split('/');
+    let Msg = finder(pkg).msg[name];
+    let one = serialize(Msg, samples[type]);
+    let data = plain(Msg.deserialize(one).data);
+    Object.keys(data).forEach((field) => {
+      let result = Msg.deserializeFields(Buffer.concat([one, trailer]), [field]);
+      assert.ok(result.buffer.equals(trailer), type + ' ' + field);
+      let expected = {};
+      Object.keys(data).forEach((key) => {
+        expected[key] = key === field ? data[key] : null;
+      });
+      assert.deepStrictEqual(plain(result.data), expected);
+    });
+  });
+});
+
+common.run();
@@ -0,0 +1,133 @@
+/*
+ *    Copyright 2016 Rethink Robotics
+ *
+ *    Copyright 2016 Chris Smith
+ *
+ *    Licensed under the Apache License, Version 2.0 (the "License");
+ *    you may not use this file except in compliance with the License.
+ *    You may obtain a copy of the License at
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *    Unless required by applicable law or agreed to in writing, software
+ *    distributed under the License is distributed on an "AS IS" BASIS,
+ *    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *    See the License for the specific language governing permissions and
+ *    limitations under the License.
+ */
+
+'use strict';
+
+//-----------------------------------------------------------------------------
+// Checks that msg_compiler.js produces the same codec as generate.py
+//
+// Every message in test/msg is generated by generate_fixtures.py and
+// compiled at runtime from genmsg's full text, then both are run over the
+// same sample message.
+//
+//   node test/test_msg_compiler.js
+//-----------------------------------------------------------------------------
+
+let assert = require('assert');
+let common = require('./common.js');
+let compiler = require('../src/genjs/msg_compiler.js');
+
+let {finder, fixtures} = common.generate();
+let {samples, serialize, plain, test} = common;
+
+//-----------------------------------------------------------------------------
+// Tests
+//-----------------------------------------------------------------------------
+
+Object.keys(samples).forEach((type) => {
+  let [pkg, name] = type.split('/');
+  let fixture = fixtures[type];
+  let Generated = finder(pkg).msg[name];
+  let sample = samples[type];
+  let Compiled;
+
+  test(type + ' md5sum', () => {
+    // compile() also checks the md5sum of the definition it parsed
+    Compiled = compiler.compile(type, fixture.definition, fixture.md5sum);
+    assert.strictEqual(Generated.md5sum(), fixture.md5sum);
+    assert.strictEqual(Compiled.md5sum(), fixture.md5sum);
+    assert.strictEqual(Compiled.datatype(), Generated.datatype());
+  });
+
+  test(type + ' serialize', () => {
+    let expected = serialize(Generated, sample);
+    assert.ok(serialize(Compiled, sample).equals(expected));
+  });
+
+  test(type + ' deserialize', () => {
+    let buffer = serialize(Generated, sample);
+    let generated = Generated.deserialize(buffer);
+    let compiled = Compiled.deserialize(buffer);
+    assert.ok(compiled.data instanceof Compiled);
+    assert.deepStrictEqual(plain(compiled.data), plain(generated.data));
+    assert.deepStrictEqual(plain(generated.data), plain(sample));
+    assert.strictEqual(compiled.buffer.length, 0);
+    assert.strictEqual(generated.buffer.length, 0);
+  });
+
+  test(type + ' skip', () => {
+    let one = serialize(Generated, sample);
+    let two = Buffer.concat([one, one]);
+    [Generated, Compiled].forEach((Msg) => {
+      assert.strictEqual(Msg.skip(one), one.length);
+      assert.strictEqual(Msg.skip(two, 0), one.length);
+      assert.strictEqual(Msg.skip(two, one.length), two.length);
+    });
+  });
+});
+
+test('genjs_test_msgs/Constants constants', () => {
+  let Generated = finder('genjs_test_msgs').msg.Constants;
+  let Compiled = compiler.compile('genjs_test_msgs/Constants',
+                                  fixtures['genjs_test_msgs/Constants'].definition);
+  assert.deepStrictEqual(Compiled.Constants, Generated.Constants);
+  assert.deepStrictEqual(Generated.Constants, {
+    IDLE: 0,
+    BUSY: 1,
+    NEGATIVE: -7,
+    SCALE: 0.5,
+    NAME: 'genjs # comments are part of string constants'
+  });
+});
+
+test('md5sum mismatch', () => {
+  let fixture = fixtures['geometry_msgs/Point'];
+  assert.throws(() => compiler.compile('genjs_test_msgs/NotAPoint', fixture.definition,
+                                       fixtures['geometry_msgs/Pose'].md5sum),
+                /md5sum mismatch/);
+});
+
+test('invalid names', () => {
+  let injected = false;
+  global.genjsInjected = () => {
+    injected = true;
+  };
+  [
+    ['evil/Msg', 'int32 a[genjsInjected()]'],
+    ['evil/Msg', 'int32 a;genjsInjected()'],
+    ['evil/Msg', 'int32 a b'],
+    ['evil/Msg', '1int32 a'],
+    ['evil/Msg', 'Bad-Type a'],
+    ['evil/Msg', 'pkg/Type/Extra a'],
+    ['evil/Msg', 'int32 a\n' + '='.repeat(80) + '\nMSG: evil/Dep{genjsInjected()}\nint32 b'],
+    ['evil/Msg', 'int32 genjsInjected()=1'],
+    ['evil/Msg{genjsInjected()}', 'int32 a'],
+    ['Msg', 'int32 a']
+  ].forEach(([datatype, definition]) => {
+    assert.throws(() => compiler.compile(datatype, definition).deserialize(Buffer.alloc(64)),
+                  /Invalid/, datatype + ': ' + definition);
+  });
+  delete global.genjsInjected;
+  assert.strictEqual(injected, false);
+  // names genmsg accepts still compile
+  let Msg = compiler.compile('genjs_test_msgs/Valid', 'int32 a_1\nuint8 B2=3\nHeader h\n' +
+                             '='.repeat(80) + '\nMSG: std_msgs/Header\n' +
+                             fixtures['std_msgs/Header'].definition);
+  assert.strictEqual(Msg.Constants.B2, 3);
+});
+
+common.run();
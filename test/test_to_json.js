@@ -0,0 +1,92 @@
+/*
+ *    Copyright 2016 Rethink Robotics
+ *
+ *    Copyright 2016 Chris Smith
+ *
+ *    Licensed under the Apache License, Version 2.0 (the "License");
+ *    you may not use this file except in compliance with the License.
+ *    You may obtain a copy of the License at
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *    Unless required by applicable law or agreed to in writing, software
+ *    distributed under the License is distributed on an "AS IS" BASIS,
+ *    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *    See the License for the specific language governing permissions and
+ *    limitations under the License.
+ */
+
+'use strict';
+
+//-----------------------------------------------------------------------------
+// Checks the generated toJSONString() transcoders against
+// JSON.stringify(deserialize()). Only genjs_test_msgs is generated with
+// --json, so nested std_msgs and geometry_msgs types take the fallback path.
+//
+//   node test/test_to_json.js
+//-----------------------------------------------------------------------------
+
+let assert = require('assert');
+let common = require('./common.js');
+
+let {finder} = common.generate(['--json']);
+let {samples, serialize, plain, test} = common;
+let msgs = finder('genjs_test_msgs').msg;
+
+// uint8[] fields of each sample, which options.base64 emits as base64 text
+let toBase64 = {
+  'genjs_test_msgs/Constants': (data) => data,
+  'genjs_test_msgs/Columns': (data) => data,
+  'genjs_test_msgs/FixedArrays': (data) => {
+    data.bytes = data.bytes.toString('base64');
+    return data;
+  },
+  'genjs_test_msgs/Builtins': (data) => {
+    data.data = data.data.toString('base64');
+    return data;
+  },
+  'genjs_test_msgs/NestedArrays': (data) => {
+    data.builtins.forEach((builtins) => {
+      builtins.data = builtins.data.toString('base64');
+    });
+    return data;
+  }
+};
+
+Object.keys(toBase64).forEach((type) => {
+  let Msg = msgs[type.split('/')[1]];
+  let buffer = serialize(Msg, samples[type]);
+
+  test(type + ' toJSONString', () => {
+    assert.strictEqual(Msg.toJSONString(buffer), JSON.stringify(Msg.deserialize(buffer).data));
+  });
+
+  test(type + ' toJSONString base64', () => {
+    let expected = toBase64[type](plain(Msg.deserialize(buffer).data));
+    assert.strictEqual(Msg.toJSONString(buffer, 0, {base64: true}), JSON.stringify(expected));
+  });
+
+  test(type + ' toJSONString offset', () => {
+    let two = Buffer.concat([buffer, buffer]);
+    let bufferOffset = [0];
+    let first = Msg.toJSONString(two, bufferOffset);
+    assert.strictEqual(bufferOffset[0], buffer.length);
+    assert.strictEqual(Msg.toJSONString(two, bufferOffset), first);
+    assert.strictEqual(bufferOffset[0], two.length);
+    assert.strictEqual(Msg.toJSONString(two, buffer.length), first);
+  });
+});
+
+test('dependencies generated without --json', () => {
+  assert.strictEqual(finder('std_msgs').msg.Header.toJSONString, undefined);
+  assert.strictEqual(finder('geometry_msgs').msg.PoseStamped.toJSONString, undefined);
+});
+
+test('non-finite floats', () => {
+  let sample = Object.assign({}, samples['genjs_test_msgs/Builtins'], {f32: -Infinity, f64: NaN});
+  let buffer = serialize(msgs.Builtins, sample);
+  let json = msgs.Builtins.toJSONString(buffer);
+  assert.strictEqual(json, JSON.stringify(msgs.Builtins.deserialize(buffer).data));
+  assert.ok(json.indexOf('"f32":null,"f64":null') >= 0);
+});
+
+common.run();